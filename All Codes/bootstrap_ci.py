@@ -0,0 +1,234 @@
+"""
+Bootstrap confidence intervals for the change metrics.
+
+Change_Pct and the event impacts compare the average consumption of an area
+in two years. For areas with few postcodes (e.g. Orkney, or any single
+DataZone) that average moves a lot with the postcodes that happen to be in
+it. The bootstrap measures how much: the postcodes of every area are
+resampled with replacement, the yearly averages and change metrics (see
+change_metrics.py) are recomputed for every replicate, and the middle
+CI_LEVEL of the replicates gives the interval.
+
+The metrics compare the same postcodes from one year to the next, and a
+postcode's consumption in one year is strongly correlated with the next, so
+the resampling is paired: a replicate draws one set of postcodes and uses it
+for every year of the area (a postcode missing in a year only counts in the
+years it has). Resampling each year on its own would ignore that correlation
+and give far too wide intervals.
+
+Within an area the postcodes are held as one postcodes x years matrix and all
+replicates of a batch are drawn as one index matrix (replicates x postcodes),
+so a batch is a single gather and mean. Areas are
+spread over a process pool. The run has a time budget: after the deadline
+no area draws more than MIN_REPLICATES replicates, so the run ends shortly
+after the budget and the Replicates column says how many replicates every
+interval is based on.
+
+Run this file to bootstrap the mean postcode consumption (the value the council
+ranking averages) of every DataZone of the cleaned data.
+
+"""
+
+import os
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from change_metrics import EVENT_WINDOWS, change_metrics, metric_columns
+
+# Number of bootstrap replicates per area (fewer if the time budget runs out)
+BOOTSTRAP_REPLICATES = 1000
+
+# Coverage of the intervals
+CI_LEVEL = 0.95
+
+# Seconds after which areas stop drawing new batches of replicates
+TIME_BUDGET_SECONDS = 60
+
+# Replicates every area draws, even after the deadline
+MIN_REPLICATES = 100
+
+# Number of worker processes; None uses one per CPU core
+WORKERS = None
+
+# Resampled values held at once per area (replicates x postcodes of a batch)
+BATCH_VALUES = 2_000_000
+
+# Windows the intervals are computed for: the whole period and the event windows
+BOOTSTRAP_WINDOWS = {"Change": (2015, 2023)} | EVENT_WINDOWS
+
+
+def area_tasks(rows: pd.DataFrame, area_col: str, unit_col: str, value_col: str, weight_col: str | None,
+               years: list) -> list:
+    """
+    Splits postcode rows into one task per area with a postcodes x years matrix of values.
+
+    Args:
+    rows (pd.DataFrame): Postcode rows with area_col, unit_col, Year and value_col columns.
+    area_col (str): Column naming the area, e.g. "Council_Area" or "DataZone".
+    unit_col (str): Column naming the resampled unit, e.g. "Postcode_Key".
+    value_col (str): Column with the value per postcode, e.g. kWh per meter.
+    weight_col (str | None): Column weighting the postcodes (e.g. Num_meters), or None for plain means.
+    years (list): The years needed by the windows.
+
+    Returns:
+    list: (area, values, weights) per area, both postcodes x years; a postcode without a value
+          in a year has value and weight 0 there, and every weight is 1 for plain means.
+    """
+    rows = rows[rows["Year"].isin(years) & rows[area_col].notna() & rows[unit_col].notna() & rows[value_col].notna()]
+    area_codes, areas = pd.factorize(rows[area_col], sort=True)
+    unit_codes, units = pd.factorize(rows[unit_col])
+    year_codes = pd.Index(years).get_indexer(rows["Year"])
+
+    # One matrix row per (area, postcode), sorted by area so every area is a contiguous run
+    pair_codes, pairs = pd.factorize(area_codes.astype("int64") * len(units) + unit_codes, sort=True)
+    starts = np.searchsorted(pairs // len(units), np.arange(len(areas) + 1))
+
+    # Zero weight where a postcode has no value, so it only counts in the years it has
+    values = np.zeros((len(pairs), len(years)))
+    values[pair_codes, year_codes] = rows[value_col].to_numpy(dtype="float64")
+    weights = np.zeros((len(pairs), len(years)))
+    weights[pair_codes, year_codes] = 1.0 if weight_col is None else rows[weight_col].to_numpy(dtype="float64")
+
+    tasks = []
+    for a, area in enumerate(areas):
+        run = slice(starts[a], starts[a + 1])
+        tasks.append((area, values[run], weights[run]))
+    return tasks
+
+
+def resample_means(values: np.ndarray, weights: np.ndarray, replicates: int, rng) -> np.ndarray:
+    """
+    Draws paired bootstrap replicates of the weighted yearly means in one gather.
+
+    Every replicate resamples the postcodes once and uses them for every year.
+
+    Args:
+    values (np.ndarray): The postcodes x years values of one area (see area_tasks).
+    weights (np.ndarray): Their weights (0 where a postcode has no value).
+    replicates (int): Number of replicates.
+    rng (np.random.Generator): The random generator.
+
+    Returns:
+    np.ndarray: replicates x years means (NaN for a year without values).
+    """
+    if len(values) == 0:
+        return np.full((replicates, values.shape[1]), np.nan)
+
+    idx = rng.integers(0, len(values), size=(replicates, len(values)))
+    w = weights[idx]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.einsum("rpy,rpy->ry", values[idx], w) / w.sum(axis=1)
+
+
+def bootstrap_area(task: tuple) -> tuple:
+    """
+    Bootstraps the change metrics of one area (runs in a worker process).
+
+    Args:
+    task (tuple): (area, values, weights from area_tasks, years, windows, replicates, level, deadline, seed).
+
+    Returns:
+    tuple: (area, lower bounds, upper bounds, number of replicates), bounds in the order of metric_columns(windows).
+    """
+    area, values, weights, years, windows, replicates, level, deadline, seed = task
+    rng = np.random.default_rng(seed)
+    batch = max(1, BATCH_VALUES // max(1, values.size))
+
+    means = []
+    drawn = 0
+    while drawn < replicates:
+        size = min(batch, replicates - drawn)
+        if time.time() > deadline:
+            if drawn >= MIN_REPLICATES:
+                break
+            size = min(size, MIN_REPLICATES - drawn)
+        means.append(resample_means(values, weights, size, rng))
+        drawn += size
+
+    metrics = change_metrics(pd.DataFrame(np.vstack(means), columns=years), windows).to_numpy()
+    tail = (1 - level) / 2 * 100
+    with warnings.catch_warnings():
+        # Metrics of areas missing a year are all NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(metrics, [tail, 100 - tail], axis=0)
+
+    return area, low, high, drawn
+
+
+def bootstrap_change_intervals(rows: pd.DataFrame, area_col: str, value_col: str, weight_col: str | None = None,
+                               unit_col: str = "Postcode_Key", windows: dict = BOOTSTRAP_WINDOWS,
+                               replicates: int = BOOTSTRAP_REPLICATES, level: float = CI_LEVEL,
+                               time_budget: float = TIME_BUDGET_SECONDS, workers: int | None = WORKERS,
+                               seed: int = 0) -> pd.DataFrame:
+    """
+    Computes bootstrap confidence intervals of every change metric for every area.
+
+    Args:
+    rows (pd.DataFrame): Postcode rows with area_col, unit_col, Year and value_col columns (one per postcode and year).
+    area_col (str): Column naming the area, e.g. "Council_Area" or "DataZone".
+    value_col (str): Column with the value per postcode, e.g. "Target_Value".
+    weight_col (str | None): Column weighting the postcodes (e.g. "Num_meters"), or None for plain means.
+    unit_col (str): Column naming the postcodes resampled together across years.
+    windows (dict): Metric name -> (start year, end year).
+    replicates (int): Replicates per area.
+    level (float): Coverage of the intervals, e.g. 0.95.
+    time_budget (float): Seconds after which areas stop drawing new batches.
+    workers (int | None): Worker processes (1 runs in this process), None for one per CPU core.
+    seed (int): Seed of the random generators (one stream per area), for reproducible intervals.
+
+    Returns:
+    pd.DataFrame: One row per area with {metric}_Low and {metric}_High per metric and Replicates.
+    """
+    years = sorted({year for window in windows.values() for year in window})
+    deadline = time.time() + time_budget
+    tasks = [(area, values, weights, years, windows, replicates, level, deadline, [seed, number])
+             for number, (area, values, weights)
+             in enumerate(area_tasks(rows, area_col, unit_col, value_col, weight_col, years))]
+
+    if workers == 1:
+        results = [bootstrap_area(task) for task in tasks]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(bootstrap_area, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+
+    columns = metric_columns(windows)
+    areas = pd.Index([area for area, *_ in results], name=area_col)
+    lows = pd.DataFrame([low for _, low, _, _ in results], index=areas, columns=[f"{c}_Low" for c in columns])
+    highs = pd.DataFrame([high for _, _, high, _ in results], index=areas, columns=[f"{c}_High" for c in columns])
+
+    intervals = pd.concat([lows, highs], axis=1)[[f"{c}_{bound}" for c in columns for bound in ("Low", "High")]]
+    intervals["Replicates"] = [drawn for *_, drawn in results]
+    return intervals
+
+
+if __name__ == "__main__":
+    from electricity_store import load_years
+    from geo_rollup import CLEAN_DATA_DIR, SSPL_FILE, attach_geography
+    from schema_registry import get_schema
+    from sspl_index import ensure_sspl_index
+
+    if not CLEAN_DATA_DIR.exists() or not SSPL_FILE.exists():
+        print("Cleaned data or SSPL file not found. Please run the cleaning and council scripts first.")
+        sys.exit(1)
+
+    years = sorted({year for window in BOOTSTRAP_WINDOWS.values() for year in window})
+    csv_paths = {year: CLEAN_DATA_DIR / f"electricity_scotland_{year}.csv" for year in years}
+    csv_paths = {year: path for year, path in csv_paths.items() if path.exists()}
+
+    panel = load_years(csv_paths, columns=["Postcode_Key", "Num_meters", "Total_cons_kwh", "Mean_cons_kwh"])
+    panel = attach_geography(panel, ensure_sspl_index(SSPL_FILE))
+    # The postcode mean, as in analyze_council_changes.py (kWh per meter in years without a mean column)
+    mean_years = [year for year, path in csv_paths.items() if "Mean_cons_kwh" in get_schema(path)]
+    per_meter = panel["Total_cons_kwh"].astype("float64") / panel["Num_meters"]
+    panel["Target_Value"] = panel["Mean_cons_kwh"].astype("float64").where(panel["Year"].isin(mean_years), per_meter)
+
+    start = time.time()
+    intervals = bootstrap_change_intervals(panel, "DataZone", "Target_Value")
+    path = CLEAN_DATA_DIR / "DataZone_Change_CI.csv"
+    intervals.to_csv(path)
+    print(f"Saved intervals for {len(intervals)} DataZones in {time.time() - start:.1f}s to: {path}")
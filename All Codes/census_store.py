@@ -0,0 +1,164 @@
+"""
+Typed ingest of the census / housing tables (housing_data.csv, housing_data_2011.csv).
+
+The census tables come as text: percentages like "45.2%", counts with
+thousands separators, placeholders such as "-" for suppressed cells, and a
+DataZone column called "Data Zone" in one file and "Datazone 2011" in the
+other. parse_census_table turns a table into numeric columns (percentages as
+numbers from 0 to 100, keeping the original column names) and renames the
+DataZone column to DataZone.
+
+The parsed table is cached as Parquet next to the CSV (housing_data.parquet),
+in the same way as the cleaned electricity data (see electricity_store.py), and
+load_census returns it indexed by DataZone, so housing composition can be
+joined to DataZone consumption with a keyed join, e.g.
+
+    dz_table.join(load_census("housing_data.csv"), on="DataZone")
+
+Run this file to parse the census tables in the project folder once.
+
+"""
+
+import sys
+import pandas as pd
+from pathlib import Path
+
+from electricity_store import HAS_PYARROW, store_path
+from schema_registry import normalise_name
+
+# Name of the DataZone key column after parsing
+CENSUS_KEY = "DataZone"
+
+# Cell values meaning "no value" (suppressed or not applicable)
+MISSING_MARKERS = ["", "-", "*", "..", "x", "X", "n/a", "N/A"]
+
+# Census tables of the project, parsed when this file is run
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CENSUS_FILES = [PROJECT_ROOT / "housing_data.csv", PROJECT_ROOT / "housing_data_2011.csv"]
+
+
+def find_key_column(columns) -> str:
+    """
+    Finds the DataZone column of a census table.
+
+    Args:
+    columns (iterable): The column names of the table.
+
+    Returns:
+    str: e.g. "Data Zone" or "Datazone 2011".
+
+    Raises:
+    ValueError: If no column, or more than one, looks like a DataZone column.
+    """
+    matches = [col for col in columns if normalise_name(col).startswith("datazone")]
+    if len(matches) != 1:
+        raise ValueError(f"Expected one DataZone column, found {matches} in {list(columns)}")
+    return matches[0]
+
+
+def parse_numeric_column(values: pd.Series) -> pd.Series | None:
+    """
+    Parses a text column of counts or percentages.
+
+    Args:
+    values (pd.Series): The column as strings.
+
+    Returns:
+    pd.Series | None: float64 values (percentages without the % sign), or None if
+                      the column holds text that is not a number.
+    """
+    text = values.str.strip()
+    text = text.where(~text.isin(MISSING_MARKERS))
+    text = text.str.rstrip("%").str.replace(",", "", regex=False)
+
+    numbers = pd.to_numeric(text, errors="coerce")
+    if (numbers.isna() & text.notna()).any():
+        return None
+    return numbers.astype("float64")
+
+
+def parse_census_table(csv_path) -> pd.DataFrame:
+    """
+    Parses a census table into typed columns keyed by DataZone.
+
+    Numeric columns become float64; other text columns become categorical.
+
+    Args:
+    csv_path (str | Path): Path to the census CSV.
+
+    Returns:
+    pd.DataFrame: The table with a DataZone column.
+    """
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    df.columns = [c.strip() for c in df.columns]
+
+    df = df.rename(columns={find_key_column(df.columns): CENSUS_KEY})
+    df[CENSUS_KEY] = df[CENSUS_KEY].str.strip()
+
+    for col in df.columns.drop(CENSUS_KEY):
+        numbers = parse_numeric_column(df[col])
+        df[col] = numbers if numbers is not None else df[col].astype("category")
+
+    return df
+
+
+def write_census_store(csv_path) -> Path | None:
+    """
+    Parses a census table and caches it as Parquet next to the CSV.
+
+    Args:
+    csv_path (str | Path): Path to the census CSV.
+
+    Returns:
+    Path | None: The Parquet path, or None if pyarrow is not installed.
+    """
+    if not HAS_PYARROW:
+        print("Warning: pyarrow not installed, census tables are parsed on every load. Please pip install pyarrow")
+        return None
+
+    parquet_path = store_path(csv_path)
+    partial = parquet_path.with_name(parquet_path.name + ".part")
+
+    parse_census_table(csv_path).to_parquet(partial, index=False)
+    partial.replace(parquet_path)
+
+    return parquet_path
+
+
+def load_census(csv_path, columns: list | None = None) -> pd.DataFrame:
+    """
+    Loads a typed census table indexed by DataZone, parsing the CSV only when its cache is missing or older.
+
+    Args:
+    csv_path (str | Path): Path to the census CSV.
+    columns (list | None): Columns to load (besides DataZone), or None for all of them.
+
+    Returns:
+    pd.DataFrame: The table indexed by DataZone.
+    """
+    csv_path = Path(csv_path)
+    parquet_path = store_path(csv_path)
+    wanted = None if columns is None else [CENSUS_KEY] + list(columns)
+
+    if HAS_PYARROW:
+        if not parquet_path.exists() or parquet_path.stat().st_mtime < csv_path.stat().st_mtime:
+            write_census_store(csv_path)
+        df = pd.read_parquet(parquet_path, columns=wanted)
+    else:
+        df = parse_census_table(csv_path)
+        if wanted is not None:
+            df = df[wanted]
+
+    return df.set_index(CENSUS_KEY)
+
+
+if __name__ == "__main__":
+    found = [path for path in CENSUS_FILES if path.exists()]
+    if not found:
+        print("No census tables found in the project folder.")
+        sys.exit(1)
+
+    for path in found:
+        table = load_census(path)
+        numeric = table.select_dtypes("number").shape[1]
+        print(f"{path.name}: {len(table)} DataZones, {numeric} of {table.shape[1]} columns numeric")
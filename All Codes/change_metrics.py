@@ -0,0 +1,296 @@
+"""
+Change metrics for event windows (e.g. the Covid lockdown, 2019 -> 2020).
+
+The rankings, maps and scatter plots all compare a start and an end year of
+the same table of yearly consumption. change_metrics computes the absolute
+(end - start, in kWh) and percentage ((end - start) / start * 100) change of
+every configured window for every area at once, as array operations on the
+area x year matrix. The table can be at any geography level: the council
+table Scotland_Council_Change_Analysis.csv, or a long table of DataZones or
+Intermediate Zones (e.g. from geo_rollup.query_cube) turned into that matrix
+with years_table.
+
+For the council table the metrics are computed once and cached next to it
+(Scotland_Council_Change_Analysis_Metrics.csv, with the window years in a
+.json file next to it); load_change_metrics returns the table with the metric
+columns, recomputing them only when the table is newer than the cache or a
+window is missing or has other years.
+
+change_tensor goes one step further and computes the change between every
+pair of years at once (areas x years x years, in kWh and %) by broadcasting,
+stored as float32 (about 4 MB for 7,000 DataZones and 9 years), so any
+"year A vs year B" comparison is an array lookup (year_change).
+
+"""
+
+import json
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Event windows: metric name -> (start year, end year)
+EVENT_WINDOWS = {
+    "Covid_Impact": (2019, 2020),
+    "Crisis_Impact": (2021, 2022),
+}
+
+# Suffix of the cached metrics file (next to the source table)
+METRICS_SUFFIX = "_Metrics"
+
+# The council table written by analyze_council_changes.py
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CHANGE_ANALYSIS_FILE = PROJECT_ROOT / "council area with elec consumption" / "Scotland_Council_Change_Analysis.csv"
+
+
+def year_columns(table: pd.DataFrame) -> dict:
+    """
+    Finds the year columns of a table.
+
+    Args:
+    table (pd.DataFrame): A table with one column per year, labelled 2019 or "2019".
+
+    Returns:
+    dict: Year (int) -> column label.
+    """
+    return {int(col): col for col in table.columns if str(col).isdigit()}
+
+
+def metric_columns(windows: dict = EVENT_WINDOWS) -> list[str]:
+    """
+    Returns the names of the metric columns of some windows.
+
+    Args:
+    windows (dict): Metric name -> (start year, end year).
+
+    Returns:
+    list[str]: {name}_kWh and {name}_Pct for every window.
+    """
+    return [f"{name}_{kind}" for name in windows for kind in ("kWh", "Pct")]
+
+
+def years_table(rows: pd.DataFrame, area_col: str, value_col: str, year_col: str = "Year") -> pd.DataFrame:
+    """
+    Turns a long table (one row per area and year) into the area x year matrix used by change_metrics.
+
+    Args:
+    rows (pd.DataFrame): e.g. the DataZone rows of the cube.
+    area_col (str): Column naming the area, e.g. "DataZone".
+    value_col (str): Column with the yearly value, e.g. "Mean_cons_kwh".
+    year_col (str): Column with the year.
+
+    Returns:
+    pd.DataFrame: One row per area, one column per year.
+    """
+    table = rows.pivot_table(index=area_col, columns=year_col, values=value_col, observed=True)
+    table.columns = [int(year) for year in table.columns]
+    return table
+
+
+def available_windows(table: pd.DataFrame, windows: dict = EVENT_WINDOWS) -> dict:
+    """
+    Keeps the windows whose start and end year are both in a table.
+
+    Args:
+    table (pd.DataFrame): One row per area, one column per year.
+    windows (dict): Metric name -> (start year, end year).
+
+    Returns:
+    dict: The windows change_metrics can compute for the table.
+    """
+    years = year_columns(table)
+    return {name: window for name, window in windows.items() if set(window) <= set(years)}
+
+
+def change_metrics(table: pd.DataFrame, windows: dict = EVENT_WINDOWS) -> pd.DataFrame:
+    """
+    Computes the absolute and percentage change of every area over every window.
+
+    Args:
+    table (pd.DataFrame): One row per area, one column per year.
+    windows (dict): Metric name -> (start year, end year).
+
+    Returns:
+    pd.DataFrame: Same index as the table, with {name}_kWh and {name}_Pct columns per window.
+
+    Raises:
+    ValueError: If a window needs a year the table does not have.
+    """
+    years = year_columns(table)
+    missing = sorted({year for window in windows.values() for year in window} - set(years))
+    if missing:
+        raise ValueError(f"Years {missing} needed by the event windows are not in the table (has {sorted(years)})")
+
+    labels = list(years.values())
+    position = {year: i for i, year in enumerate(years)}
+    values = table[labels].to_numpy(dtype="float64")
+
+    # One gather for all start years and one for all end years: areas x windows
+    start = values[:, [position[s] for s, _ in windows.values()]]
+    end = values[:, [position[e] for _, e in windows.values()]]
+    change = end - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = (change / start) * 100
+
+    # Columns in the order of metric_columns: change and percentage change of each window
+    metrics = np.stack([change, change_pct], axis=2).reshape(len(table), 2 * len(windows))
+    return pd.DataFrame(metrics, index=table.index, columns=metric_columns(windows))
+
+
+def change_tensor(table: pd.DataFrame, dtype: str = "float32") -> dict:
+    """
+    Computes the change between every pair of years for every area in one broadcast.
+
+    Args:
+    table (pd.DataFrame): One row per area, one column per year.
+    dtype (str): Type of the stored changes (float32 halves the memory of float64).
+
+    Returns:
+    dict: "areas" (the table index), "years" (list of int) and "kwh" and "pct" arrays
+          of shape areas x years x years, where [area, i, j] is the change from year i to year j.
+    """
+    years = year_columns(table)
+    values = table[list(years.values())].to_numpy(dtype="float64")
+
+    start = values[:, :, np.newaxis]
+    change = values[:, np.newaxis, :] - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = (change / start) * 100
+
+    return {
+        "areas": table.index,
+        "years": list(years),
+        "kwh": change.astype(dtype),
+        "pct": change_pct.astype(dtype),
+    }
+
+
+def year_change(tensor: dict, start: int, end: int, kind: str = "pct") -> pd.Series:
+    """
+    Looks up the change of every area from one year to another.
+
+    Args:
+    tensor (dict): A tensor from change_tensor or load_change_tensor.
+    start (int): The year compared from.
+    end (int): The year compared to.
+    kind (str): "pct" for percentage change, "kwh" for absolute change.
+
+    Returns:
+    pd.Series: The change per area.
+    """
+    i, j = tensor["years"].index(start), tensor["years"].index(end)
+    return pd.Series(tensor[kind][:, i, j], index=tensor["areas"], name=f"{start}_{end}")
+
+
+def save_change_tensor(tensor: dict, path, dtype: str = "float32") -> Path:
+    """
+    Saves a change tensor.
+
+    Args:
+    tensor (dict): A tensor from change_tensor.
+    path (str | Path): Target .npz file.
+    dtype (str): Type of the stored changes (float32 halves the file of float64).
+
+    Returns:
+    Path: The written file.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".part.npz")
+    np.savez(partial, areas=tensor["areas"].to_numpy(dtype=str), area_name=str(tensor["areas"].name),
+             years=np.asarray(tensor["years"]), kwh=tensor["kwh"].astype(dtype), pct=tensor["pct"].astype(dtype))
+    partial.replace(path)
+    return path
+
+
+def load_change_tensor(path) -> dict:
+    """
+    Loads a saved change tensor.
+
+    Args:
+    path (str | Path): The .npz file.
+
+    Returns:
+    dict: The tensor (see change_tensor).
+    """
+    with np.load(path) as data:
+        return {
+            "areas": pd.Index(data["areas"], name=str(data["area_name"])),
+            "years": data["years"].tolist(),
+            "kwh": data["kwh"],
+            "pct": data["pct"],
+        }
+
+
+def metrics_path(csv_path) -> Path:
+    """
+    Returns where the metrics of a table are cached.
+
+    Args:
+    csv_path (str | Path): Path to the table, e.g. Scotland_Council_Change_Analysis.csv.
+
+    Returns:
+    Path: e.g. Scotland_Council_Change_Analysis_Metrics.csv.
+    """
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.stem + METRICS_SUFFIX + csv_path.suffix)
+
+
+def write_change_metrics(csv_path, windows: dict = EVENT_WINDOWS) -> Path:
+    """
+    Computes the metrics of a table and caches the table with them.
+
+    Args:
+    csv_path (str | Path): Path to the table (areas as the first column).
+    windows (dict): Metric name -> (start year, end year).
+
+    Returns:
+    Path: The cached file.
+    """
+    table = pd.read_csv(csv_path, index_col=0)
+    table = table.drop(columns=table.columns.intersection(metric_columns(windows)))
+    table = table.join(change_metrics(table, windows))
+
+    path = metrics_path(csv_path)
+    path.with_suffix(".json").unlink(missing_ok=True)
+    partial = path.with_name(path.name + ".part")
+    table.to_csv(partial)
+    partial.replace(path)
+
+    # The years of every window, so a cache computed for other years is not reused
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump({name: list(window) for name, window in windows.items()}, f)
+
+    return path
+
+
+def load_change_metrics(csv_path, windows: dict = EVENT_WINDOWS) -> pd.DataFrame:
+    """
+    Loads a table with the metrics of every window, computing them only when the cache is missing,
+    older than the table or was computed for other window years.
+
+    Args:
+    csv_path (str | Path): Path to the table, e.g. Scotland_Council_Change_Analysis.csv.
+    windows (dict): Metric name -> (start year, end year).
+
+    Returns:
+    pd.DataFrame: The table with {name}_kWh and {name}_Pct columns per window.
+    """
+    csv_path = Path(csv_path)
+    path = metrics_path(csv_path)
+    windows_file = path.with_suffix(".json")
+    if path.exists() and windows_file.exists() and path.stat().st_mtime >= csv_path.stat().st_mtime:
+        with open(windows_file) as f:
+            cached = json.load(f)
+        if all(cached.get(name) == list(window) for name, window in windows.items()):
+            return pd.read_csv(path, index_col=0)
+
+    return pd.read_csv(write_change_metrics(csv_path, windows), index_col=0)
+
+
+if __name__ == "__main__":
+    if not CHANGE_ANALYSIS_FILE.exists():
+        print(f"{CHANGE_ANALYSIS_FILE.name} not found. Please run analyze_council_changes.py first.")
+        sys.exit(1)
+
+    path = write_change_metrics(CHANGE_ANALYSIS_FILE)
+    print(f"Saved the metrics of {len(EVENT_WINDOWS)} event windows to: {path}")
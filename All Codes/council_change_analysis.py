@@ -1,4 +1,4 @@
-import pandas as pd
+from sspl_index import ensure_sspl_index, sspl_frame
 COUNCIL_MAP = {"S12000005": "Clackmannanshire", "S12000006": "Dumfries and Galloway", "S12000008": "East Ayrshire",
         "S12000010": "East Lothian", "S12000011": "East Renfrewshire", "S12000013": "Na h-Eileanan Siar",
         "S12000014": "Falkirk", "S12000017": "Highland", "S12000018": "Inverclyde", "S12000019": "Midlothian",
@@ -12,7 +12,9 @@ COUNCIL_MAP = {"S12000005": "Clackmannanshire", "S12000006": "Dumfries and Gallo
         "S12000049": "Glasgow City", "S12000050": "North Lanarkshire"}
 
 
-sspl_df = pd.read_csv('council area with elec consumption/Scottish_Postcode_Lookup_2025_1.csv')
+# Postcodes and council codes come from the prebuilt SSPL index instead of the full CSV
+sspl_index = ensure_sspl_index('council area with elec consumption/Scottish_Postcode_Lookup_2025_1.csv')
+sspl_df = sspl_frame(sspl_index, ['Council_Code'], with_space=True).rename(columns={'Council_Code': 'CouncilArea2019Code'})
 sspl_df = sspl_df[['Postcode', 'CouncilArea2019Code']]
 #Adding council area info to each postcode and council code
 sspl_df['Council_Area'] = sspl_df['CouncilArea2019Code'].map(COUNCIL_MAP)
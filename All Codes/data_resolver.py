@@ -0,0 +1,109 @@
+"""
+Central resolver for the project's data files and folders.
+
+The scripts used to probe a handful of paths for every file and then fall back
+to PROJECT_ROOT.rglob(name), which walks the whole tree (including .git and the
+raw download cache) once per file and year. Instead, the folders where the
+project keeps its artifacts (SEARCH_DIRS) are listed once, the listing is
+cached per folder, and a name is then resolved with a dictionary lookup.
+A folder is only listed again when its modification time changes, i.e. when
+files were added or removed.
+
+Names that are not found fail fast: find_data returns None and
+not_found_message says where it looked, so the scripts can print a clear error.
+
+"""
+
+import os
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Folders (relative to the project root) holding the project's artifacts, in search order
+SEARCH_DIRS = [
+    ".",
+    "council area with elec consumption",
+    "cleaning data with code",
+    "cleaning data with code/clean_data",
+    "clean_data",
+    "All Codes/clean_data",
+    "visualisation_code_plot",
+]
+
+# Cached listings: folder -> (modification time, {name: is a folder})
+_LISTINGS = {}
+
+
+def list_folder(folder: Path) -> dict[str, bool]:
+    """
+    Returns the entries of a folder, listing it again only if it changed since the last call.
+
+    Args:
+    folder (Path): The folder to list.
+
+    Returns:
+    dict[str, bool]: Entry name -> True for folders, False for files (empty if the folder does not exist).
+    """
+    try:
+        mtime = folder.stat().st_mtime_ns
+    except OSError:
+        _LISTINGS.pop(folder, None)
+        return {}
+
+    cached = _LISTINGS.get(folder)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with os.scandir(folder) as entries:
+        listing = {entry.name: entry.is_dir() for entry in entries}
+    _LISTINGS[folder] = (mtime, listing)
+    return listing
+
+
+def search_folders(prefer=()) -> list[Path]:
+    """
+    Returns the folders searched for data, in order.
+
+    Args:
+    prefer (iterable): Folders searched first, e.g. the calling script's folder.
+
+    Returns:
+    list[Path]: The preferred folders, SEARCH_DIRS and the working directory, without duplicates.
+    """
+    folders = [Path(p).resolve() for p in prefer]
+    folders += [(PROJECT_ROOT / d).resolve() for d in SEARCH_DIRS]
+    folders.append(Path.cwd().resolve())
+    return list(dict.fromkeys(folders))
+
+
+def find_data(name: str, is_dir: bool = False, prefer=()) -> Path | None:
+    """
+    Resolves a data file or folder by name.
+
+    Args:
+    name (str): e.g. "Scotland_Council_Change_Analysis.csv" or "clean_data".
+    is_dir (bool): Look for a folder instead of a file.
+    prefer (iterable): Folders searched before SEARCH_DIRS.
+
+    Returns:
+    Path | None: The first match, or None if the name is in none of the folders.
+    """
+    for folder in search_folders(prefer):
+        if list_folder(folder).get(name) == is_dir:
+            return folder / name
+    return None
+
+
+def not_found_message(name: str, prefer=()) -> str:
+    """
+    Describes where a missing name was looked for.
+
+    Args:
+    name (str): The name that was not found.
+    prefer (iterable): The preferred folders that were searched.
+
+    Returns:
+    str: A message listing the searched folders.
+    """
+    folders = ", ".join(str(folder) for folder in search_folders(prefer))
+    return f"'{name}' not found. Searched: {folders}"
@@ -0,0 +1,207 @@
+"""
+Crosswalk between the 2011 and 2022 DataZones.
+
+The 2011 census tables use DataZone2011 codes while the electricity analyses
+use DataZone2022. Instead of re-merging through postcodes every time, the
+crosswalk is built once from the SSPL index as a sparse apportionment matrix:
+entry (target, source) is the share of a source DataZone's postcodes (or
+meters) that lies in the target DataZone. Each source column sums to 1, so a
+DataZone-level vector of counts or totals is moved to the other vintage with
+one sparse matrix-vector product.
+
+Only additive values (kWh totals, meters, households, people) should be
+remapped; remap totals and counts and divide afterwards to get means.
+
+scipy is optional: with it the matrix is a scipy.sparse CSR matrix, without it
+the same product is computed from the (row, column, weight) triplets with numpy.
+
+"""
+
+import importlib.util
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sspl_index import ensure_sspl_index, index_dir_for, lookup_keys
+
+# scipy is optional: without it the product is computed with numpy
+HAS_SCIPY = importlib.util.find_spec("scipy") is not None
+
+# Default locations when run as a script
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CLEAN_DATA_DIR = PROJECT_ROOT / "cleaning data with code" / "clean_data"
+SSPL_FILE = PROJECT_ROOT / "council area with elec consumption" / "Scottish_Postcode_Lookup_2025_1.csv"
+
+
+def build_crosswalk(index: dict, source: str = "2011", target: str = "2022", meters: pd.DataFrame | None = None) -> dict:
+    """
+    Builds the apportionment matrix from one DataZone vintage to the other.
+
+    Each postcode counts with its meters when meters are given; source DataZones
+    without any meters fall back to counting postcodes.
+
+    Args:
+    index (dict): A loaded SSPL index.
+    source (str): Vintage of the input vectors, "2011" or "2022".
+    target (str): Vintage of the output vectors.
+    meters (pd.DataFrame | None): Postcode_Key and Num_meters columns (e.g. one year of the panel),
+                                  or None to weight every postcode equally.
+
+    Returns:
+    dict: "source" and "target" (the DataZone codes of the columns and rows) and
+          "rows", "cols", "weights" (the non-zero entries of the matrix).
+    """
+    keys = np.asarray(index["Postcode_Key"])
+    zones = lookup_keys(index, keys, [f"DataZone{source}", f"DataZone{target}"])
+    pairs = pd.DataFrame({"Source": zones[f"DataZone{source}"], "Target": zones[f"DataZone{target}"], "Postcodes": 1.0})
+
+    if meters is not None:
+        per_postcode = meters.groupby("Postcode_Key")["Num_meters"].sum().astype("float64")
+        pairs["Meters"] = per_postcode.reindex(keys).fillna(0).to_numpy()
+    else:
+        pairs["Meters"] = 0.0
+
+    pairs = pairs.dropna(subset=["Source", "Target"])
+    pairs = pairs.groupby(["Source", "Target"], observed=True)[["Postcodes", "Meters"]].sum().reset_index()
+
+    # Share of each source DataZone going to each target, by meters where the zone has any
+    meter_total = pairs.groupby("Source", observed=True)["Meters"].transform("sum")
+    postcode_total = pairs.groupby("Source", observed=True)["Postcodes"].transform("sum")
+    weights = np.where(meter_total > 0, pairs["Meters"] / meter_total.where(meter_total > 0, 1),
+                       pairs["Postcodes"] / postcode_total)
+
+    source_codes = pd.Index(pairs["Source"].cat.remove_unused_categories().cat.categories.astype(str))
+    target_codes = pd.Index(pairs["Target"].cat.remove_unused_categories().cat.categories.astype(str))
+
+    return {
+        "source": source_codes,
+        "target": target_codes,
+        "rows": target_codes.get_indexer(pairs["Target"].astype(str)),
+        "cols": source_codes.get_indexer(pairs["Source"].astype(str)),
+        "weights": np.asarray(weights, dtype="float64"),
+    }
+
+
+def crosswalk_path(sspl_csv, source: str = "2011", target: str = "2022") -> Path:
+    """
+    Returns where a crosswalk is saved: inside the SSPL index folder, so it is dropped when the index is rebuilt.
+
+    Args:
+    sspl_csv (str | Path): Path to the SSPL CSV.
+    source (str): Source vintage.
+    target (str): Target vintage.
+
+    Returns:
+    Path: e.g. Scottish_Postcode_Lookup_2025_1.index/crosswalk_2011_to_2022.npz.
+    """
+    return index_dir_for(sspl_csv) / f"crosswalk_{source}_to_{target}.npz"
+
+
+def save_crosswalk(crosswalk: dict, path) -> Path:
+    """
+    Saves a crosswalk.
+
+    Args:
+    crosswalk (dict): A crosswalk from build_crosswalk.
+    path (str | Path): Target .npz file.
+
+    Returns:
+    Path: The written file.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".part.npz")
+    np.savez(partial, source=crosswalk["source"].to_numpy(dtype=str), target=crosswalk["target"].to_numpy(dtype=str),
+             rows=crosswalk["rows"], cols=crosswalk["cols"], weights=crosswalk["weights"])
+    partial.replace(path)
+    return path
+
+
+def load_crosswalk(path) -> dict:
+    """
+    Loads a saved crosswalk.
+
+    Args:
+    path (str | Path): The .npz file.
+
+    Returns:
+    dict: The crosswalk (see build_crosswalk).
+    """
+    with np.load(path) as data:
+        return {
+            "source": pd.Index(data["source"]),
+            "target": pd.Index(data["target"]),
+            "rows": data["rows"],
+            "cols": data["cols"],
+            "weights": data["weights"],
+        }
+
+
+def crosswalk_matrix(crosswalk: dict):
+    """
+    Returns the crosswalk as a scipy.sparse CSR matrix (targets x sources).
+
+    Args:
+    crosswalk (dict): A crosswalk from build_crosswalk or load_crosswalk.
+
+    Returns:
+    scipy.sparse.csr_matrix | None: The matrix, or None if scipy is not installed.
+    """
+    if not HAS_SCIPY:
+        print("Warning: scipy not installed, using numpy for the crosswalk. Please pip install scipy")
+        return None
+
+    from scipy.sparse import csr_matrix
+    shape = (len(crosswalk["target"]), len(crosswalk["source"]))
+    return csr_matrix((crosswalk["weights"], (crosswalk["rows"], crosswalk["cols"])), shape=shape)
+
+
+def remap(crosswalk: dict, values):
+    """
+    Moves DataZone-level totals or counts to the other vintage.
+
+    Args:
+    crosswalk (dict): A crosswalk from build_crosswalk or load_crosswalk.
+    values (pd.Series | pd.DataFrame): Additive values indexed by source DataZone code
+                                       (DataZones missing from the index count as 0).
+
+    Returns:
+    pd.Series | pd.DataFrame: The values indexed by target DataZone code.
+    """
+    if isinstance(values, pd.DataFrame):
+        return pd.DataFrame({col: remap(crosswalk, values[col]) for col in values.columns})
+
+    x = values.reindex(crosswalk["source"]).fillna(0).to_numpy(dtype="float64")
+
+    matrix = crosswalk_matrix(crosswalk) if HAS_SCIPY else None
+    if matrix is not None:
+        y = matrix @ x
+    else:
+        # The same product from the (row, column, weight) triplets
+        y = np.bincount(crosswalk["rows"], weights=crosswalk["weights"] * x[crosswalk["cols"]],
+                        minlength=len(crosswalk["target"]))
+
+    return pd.Series(y, index=crosswalk["target"], name=values.name)
+
+
+if __name__ == "__main__":
+    if not SSPL_FILE.exists():
+        print("SSPL file not found. Please run the council scripts first.")
+        sys.exit(1)
+
+    from electricity_store import load_years
+
+    index = ensure_sspl_index(SSPL_FILE)
+
+    # Weight by the meters of the latest cleaned year, if there is one
+    latest = sorted(CLEAN_DATA_DIR.glob("electricity_scotland_*.csv"))
+    meters = None
+    if latest:
+        year = int(latest[-1].stem.rsplit("_", 1)[1])
+        meters = load_years({year: latest[-1]}, columns=["Postcode_Key", "Num_meters"])
+        print(f"Weighting by the meters of {year}")
+
+    for source, target in [("2011", "2022"), ("2022", "2011")]:
+        crosswalk = build_crosswalk(index, source, target, meters)
+        path = save_crosswalk(crosswalk, crosswalk_path(SSPL_FILE, source, target))
+        print(f"Saved crosswalk {source} -> {target} with {len(crosswalk['weights'])} entries to: {path}")
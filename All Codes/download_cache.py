@@ -0,0 +1,256 @@
+"""
+Download cache for the raw gov.uk and NRS source files.
+
+Every download is streamed to disk and stored once under its SHA-256 checksum
+(raw_data/objects/{sha256}). A small index (one JSON file per URL in raw_data/index)
+remembers which checksum, ETag and Last-Modified value each URL had, so re-runs
+reuse the raw files instead of downloading gigabytes again.
+
+Interrupted downloads are kept in raw_data/partial and resumed with an HTTP
+Range request the next time, as long as the server still reports the same ETag.
+
+"""
+
+import hashlib
+import json
+import os
+import requests
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Folder holding the cached raw files
+RAW_CACHE_DIR = "raw_data"
+
+# Bytes read from the network (and hashed) at a time
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Seconds to wait for the server before giving up
+TIMEOUT_SECONDS = 60
+
+
+def url_key(url: str) -> str:
+    """
+    Returns a short, file-name safe key for a URL.
+
+    Args:
+    url (str): The download URL.
+
+    Returns:
+    str: The first 16 hex digits of the URL's SHA-256.
+    """
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def load_entry(url: str, cache_dir=RAW_CACHE_DIR) -> dict | None:
+    """
+    Reads the index entry of a URL.
+
+    Args:
+    url (str): The download URL.
+    cache_dir (str | Path): The cache folder.
+
+    Returns:
+    dict | None: The entry (sha256, size, etag, last_modified), or None if the URL was never cached.
+    """
+    entry_file = Path(cache_dir) / "index" / f"{url_key(url)}.json"
+    if not entry_file.exists():
+        return None
+    with open(entry_file) as f:
+        return json.load(f)
+
+
+def save_entry(url: str, entry: dict, cache_dir=RAW_CACHE_DIR):
+    """
+    Writes the index entry of a URL atomically.
+
+    Each URL has its own entry file, so parallel cleaning workers never overwrite each other.
+
+    Args:
+    url (str): The download URL.
+    entry (dict): The entry to save.
+    cache_dir (str | Path): The cache folder.
+    """
+    entry_file = Path(cache_dir) / "index" / f"{url_key(url)}.json"
+    entry_file.parent.mkdir(parents=True, exist_ok=True)
+    partial = entry_file.with_name(entry_file.name + ".part")
+    with open(partial, "w") as f:
+        json.dump(dict(entry, url=url), f, indent=2, sort_keys=True)
+    os.replace(partial, entry_file)
+
+
+@contextmanager
+def url_lock(url: str, cache_dir=RAW_CACHE_DIR):
+    """
+    Holds an exclusive lock on a URL so two processes never download it at the same time.
+
+    The lock is released by the operating system if the process dies.
+
+    Args:
+    url (str): The download URL.
+    cache_dir (str | Path): The cache folder.
+    """
+    lock_file = Path(cache_dir) / "partial" / f"{url_key(url)}.lock"
+    with open(lock_file, "a+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def cached_path(url: str, cache_dir=RAW_CACHE_DIR, sha256: str | None = None) -> Path | None:
+    """
+    Looks up a URL in the cache without touching the network.
+
+    Args:
+    url (str): The download URL.
+    cache_dir (str | Path): The cache folder.
+    sha256 (str | None): If given, the cached file must have this checksum.
+
+    Returns:
+    Path | None: The cached file, or None if it is not cached.
+    """
+    entry = load_entry(url, cache_dir)
+    if not entry:
+        return None
+    if sha256 and entry["sha256"] != sha256.lower():
+        return None
+
+    path = Path(cache_dir) / "objects" / entry["sha256"]
+    return path if path.exists() else None
+
+
+def fetch(url: str, cache_dir=RAW_CACHE_DIR, sha256: str | None = None, revalidate: bool = False) -> Path:
+    """
+    Returns a local copy of a URL, downloading it only if it is not cached yet.
+
+    Args:
+    url (str): The download URL.
+    cache_dir (str | Path): The cache folder.
+    sha256 (str | None): Expected checksum of the file; the download fails if it does not match.
+    revalidate (bool): Ask the server whether the cached copy is still current
+                       (using its ETag / Last-Modified) instead of trusting it.
+
+    Returns:
+    Path: The cached file.
+    """
+    cache_dir = Path(cache_dir)
+    (cache_dir / "objects").mkdir(parents=True, exist_ok=True)
+    (cache_dir / "partial").mkdir(parents=True, exist_ok=True)
+
+    path = cached_path(url, cache_dir, sha256)
+    if path and not revalidate:
+        return path
+
+    # Another worker may be downloading the same URL; wait for it and reuse its result
+    with url_lock(url, cache_dir):
+        return download(url, cache_dir, sha256, revalidate)
+
+
+def download(url: str, cache_dir: Path, sha256: str | None, revalidate: bool) -> Path:
+    """
+    Downloads a URL into the cache. Call through fetch, which holds the URL lock.
+
+    Args:
+    url (str): The download URL.
+    cache_dir (Path): The cache folder.
+    sha256 (str | None): Expected checksum of the file.
+    revalidate (bool): Check a cached copy with the server instead of trusting it.
+
+    Returns:
+    Path: The cached file.
+    """
+    entry = load_entry(url, cache_dir)
+    path = cached_path(url, cache_dir, sha256)
+
+    if path and not revalidate:
+        return path
+
+    # Byte ranges only line up if the server sends the file without compression
+    headers = {"Accept-Encoding": "identity"}
+    if path:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    partial = cache_dir / "partial" / f"{url_key(url)}.part"
+    partial_meta = partial.with_suffix(".json")
+
+    # Resume an interrupted download, but only if the server can tell us the file has not changed
+    resume_from = 0
+    if not path and partial.exists() and partial_meta.exists():
+        with open(partial_meta) as f:
+            validator = json.load(f).get("etag")
+        if validator:
+            resume_from = partial.stat().st_size
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = validator
+
+    with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as response:
+        if response.status_code == 304:
+            return path
+
+        # 416: the range starts at the end of the file, i.e. the partial file already holds the whole body
+        complete = response.status_code == 416 and resume_from > 0
+        if complete and response.headers.get("Content-Range", "").rpartition("/")[2] != str(resume_from):
+            # The server reports another size, so the partial file cannot be trusted: start again
+            partial.unlink()
+            partial_meta.unlink()
+            return download(url, cache_dir, sha256, revalidate)
+        if not complete:
+            response.raise_for_status()
+
+        digest = hashlib.sha256()
+        if complete or (response.status_code == 206 and resume_from):
+            # Hash the bytes we already have before appending the rest
+            with open(partial, "rb") as f:
+                for block in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+                    digest.update(block)
+            mode = "ab"
+        else:
+            mode = "wb"
+
+        etag = validator if complete else response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with open(partial_meta, "w") as f:
+            json.dump({"url": url, "etag": etag}, f)
+
+        if not complete:
+            with open(partial, mode) as f:
+                for block in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                    f.write(block)
+                    digest.update(block)
+
+    checksum = digest.hexdigest()
+    if sha256 and checksum != sha256.lower():
+        partial.unlink()
+        partial_meta.unlink()
+        raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {checksum}")
+
+    path = cache_dir / "objects" / checksum
+    os.replace(partial, path)
+    partial_meta.unlink()
+
+    save_entry(url, {
+        "sha256": checksum,
+        "size": path.stat().st_size,
+        "etag": etag,
+        "last_modified": last_modified,
+    }, cache_dir)
+
+    return path
@@ -0,0 +1,426 @@
+"""
+Typed columnar store for the cleaned Scottish electricity data.
+
+The cleaning stage writes every year twice: the readable CSV
+(clean_data/electricity_scotland_{year}.csv) and a Parquet file next to it
+with numeric kWh and meter columns and categorical postcodes.
+Columns are always stored and returned under their canonical names
+(see schema_registry.py), whatever the source file called them.
+Analysis scripts read the Parquet file and load only the columns they need,
+so nothing has to be parsed from text again.
+
+All years are also collected in one long-format panel
+(clean_data/consumption_panel), partitioned by year in Year={year} folders.
+Next to the postcode text the panel carries an integer Postcode_Key
+(postcodes.encode_postcodes), so joins with the SSPL index compare integers.
+A query for a range of years only opens those folders, and adding a new year
+only writes one new folder. load_years stacks the years an analysis needs
+(from the panel, or the yearly files where the panel is missing or older) so
+geography can be joined once and every year aggregated in one groupby.
+
+For holding many years in memory at once, load_compact_year and
+read_panel(compact=True) shrink the frames further (unsigned meter counts,
+float32 kWh); memory_footprint reports how much memory a frame takes.
+
+Parquet needs the optional pyarrow package. Without it the readers fall back
+to the CSV and convert the columns to the same types.
+
+"""
+
+import importlib.util
+import shutil
+import pandas as pd
+from pathlib import Path
+
+from postcodes import encode_postcodes
+from schema_registry import get_schema, read_with_schema
+
+# pyarrow is optional: without it everything is read from the CSV files
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Column types of the cleaned data
+CLEAN_DTYPES = {
+    "Outcode": "category",
+    "Postcode": "category",
+    "Postcode_Key": "int64",
+    "Num_meters": "Int64",
+    "Total_cons_kwh": "float64",
+    "Mean_cons_kwh": "float64",
+    "Median_cons_kwh": "float64",
+}
+
+# Smaller in-memory types: kWh values are only measured to 0.1 kWh, which float32 keeps
+# for single postcodes. Upcast to float64 before summing over many postcodes.
+COMPACT_DTYPES = {
+    "Outcode": "category",
+    "Postcode": "category",
+    "Postcode_Key": "int64",
+    "Num_meters": "UInt32",
+    "Total_cons_kwh": "float32",
+    "Mean_cons_kwh": "float32",
+    "Median_cons_kwh": "float32",
+}
+
+# Folder (inside clean_data) holding the multi-year panel
+PANEL_DIR_NAME = "consumption_panel"
+
+# Columns of the panel, besides the Year taken from the partition folder
+PANEL_COLUMNS = ["Postcode", "Postcode_Key", "Num_meters", "Total_cons_kwh", "Mean_cons_kwh", "Median_cons_kwh"]
+
+
+def store_path(csv_path) -> Path:
+    """
+    Returns the Parquet file that belongs to a cleaned CSV file.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+
+    Returns:
+    Path: The same path with a .parquet suffix.
+    """
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def to_typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a cleaned dataframe read as text into the types of CLEAN_DTYPES.
+
+    Numbers that cannot be parsed become missing values; columns that are not
+    in CLEAN_DTYPES are left untouched.
+
+    Args:
+    df (pd.DataFrame): Cleaned electricity data, usually read with dtype=str.
+
+    Returns:
+    pd.DataFrame: The dataframe with typed columns.
+    """
+    df.columns = [c.strip() for c in df.columns]
+
+    for col, dtype in CLEAN_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype(str).str.strip().astype("category")
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+
+    return df
+
+
+def to_compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrinks a typed dataframe to the types of COMPACT_DTYPES.
+
+    Args:
+    df (pd.DataFrame): Cleaned electricity data with typed columns.
+
+    Returns:
+    pd.DataFrame: The same data using less memory.
+    """
+    for col, dtype in COMPACT_DTYPES.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+
+    return df
+
+
+def memory_footprint(df: pd.DataFrame, label: str | None = None) -> int:
+    """
+    Measures the memory used by a dataframe, including the strings of categorical columns.
+
+    Args:
+    df (pd.DataFrame): The dataframe to measure.
+    label (str | None): If given, the footprint is printed with this label.
+
+    Returns:
+    int: The footprint in bytes.
+    """
+    size = int(df.memory_usage(deep=True, index=True).sum())
+    if label:
+        print(f"{label}: {size / 1024 ** 2:.1f} MB for {len(df)} rows")
+    return size
+
+
+def read_csv_columns(csv_path, columns: list | None = None) -> pd.DataFrame:
+    """
+    Reads canonical columns of a cleaned CSV file with their CLEAN_DTYPES types.
+
+    The column layout comes from the schema registry, so only the requested columns are
+    parsed and numbers are parsed as numbers. If a column holds values that are not
+    numbers, the file is read as text and those values become missing instead.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+    columns (list | None): Canonical columns to load, or None for all of them.
+
+    Returns:
+    pd.DataFrame: The typed columns.
+    """
+    # Text columns are read as strings so to_typed_frame can strip them before categorising
+    dtypes = {c: (str if t == "category" else t) for c, t in CLEAN_DTYPES.items()}
+    try:
+        df = read_with_schema(csv_path, columns, dtypes)
+    except (ValueError, TypeError):
+        df = read_with_schema(csv_path, columns, dict.fromkeys(CLEAN_DTYPES, str))
+
+    return to_typed_frame(df)
+
+
+def write_clean_store(csv_path) -> Path | None:
+    """
+    Builds the typed Parquet file for a cleaned CSV file.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+
+    Returns:
+    Path | None: The Parquet path, or None if pyarrow is not installed.
+    """
+    if not HAS_PYARROW:
+        print("Warning: pyarrow not installed, keeping CSV only. Please pip install pyarrow")
+        return None
+
+    parquet_path = store_path(csv_path)
+    partial = parquet_path.with_name(parquet_path.name + ".part")
+
+    df = read_csv_columns(csv_path)
+    df.to_parquet(partial, index=False)
+    partial.replace(parquet_path)
+
+    return parquet_path
+
+
+def read_clean_year(csv_path, columns: list | None = None) -> pd.DataFrame:
+    """
+    Loads one year of cleaned electricity data with typed columns.
+
+    Reads the Parquet store when it exists and is up to date, otherwise the CSV.
+    Only the requested columns are read in both cases.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+    columns (list | None): Canonical columns to load, or None for all of them.
+
+    Returns:
+    pd.DataFrame: The cleaned data for that year.
+    """
+    csv_path = Path(csv_path)
+    parquet_path = store_path(csv_path)
+
+    if HAS_PYARROW and parquet_path.exists():
+        if not csv_path.exists() or parquet_path.stat().st_mtime >= csv_path.stat().st_mtime:
+            return pd.read_parquet(parquet_path, columns=columns)
+
+    return read_csv_columns(csv_path, columns)
+
+
+def load_compact_year(csv_path, columns: list | None = None, report: bool = False) -> pd.DataFrame:
+    """
+    Loads one year of cleaned electricity data with the compact types of COMPACT_DTYPES.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+    columns (list | None): Columns to load, or None for all of them.
+    report (bool): Print the memory footprint of the loaded frame.
+
+    Returns:
+    pd.DataFrame: The cleaned data for that year.
+    """
+    df = to_compact_frame(read_clean_year(csv_path, columns))
+    if report:
+        memory_footprint(df, Path(csv_path).stem)
+    return df
+
+
+def panel_partition(panel_dir, year: int) -> Path:
+    """
+    Returns the folder holding one year of the panel.
+
+    Args:
+    panel_dir (str | Path): The panel folder, e.g. clean_data/consumption_panel.
+    year (int): The year of the partition.
+
+    Returns:
+    Path: panel_dir/Year={year}.
+    """
+    return Path(panel_dir) / f"Year={year}"
+
+
+def panel_years(panel_dir) -> list[int]:
+    """
+    Lists the years currently stored in the panel.
+
+    Args:
+    panel_dir (str | Path): The panel folder.
+
+    Returns:
+    list[int]: The stored years in ascending order.
+    """
+    panel_dir = Path(panel_dir)
+    if not panel_dir.is_dir():
+        return []
+
+    years = []
+    for partition in panel_dir.glob("Year=*"):
+        year = partition.name.split("=", 1)[1]
+        if partition.is_dir() and year.isdigit() and any(partition.glob("part.*")):
+            years.append(int(year))
+
+    return sorted(years)
+
+
+def write_panel_year(csv_path, year: int, panel_dir) -> Path:
+    """
+    Adds (or replaces) one year of the panel from a cleaned CSV file.
+
+    The partition is written to a temporary folder and swapped in at the end,
+    so the other years are never touched and a failed write leaves no half partition.
+
+    Args:
+    csv_path (str | Path): Path to clean_data/electricity_scotland_{year}.csv.
+    year (int): The year of the data.
+    panel_dir (str | Path): The panel folder.
+
+    Returns:
+    Path: The partition folder that was written.
+    """
+    partition = panel_partition(panel_dir, year)
+    staging = partition.with_name(partition.name + ".part")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    df = read_clean_year(csv_path)
+    df["Postcode_Key"] = encode_postcodes(df["Postcode"])
+    # Every partition has every column (missing ones empty), so years can be read together
+    df = df.reindex(columns=PANEL_COLUMNS)
+
+    if HAS_PYARROW:
+        df.to_parquet(staging / "part.parquet", index=False)
+    else:
+        df.to_csv(staging / "part.csv", index=False)
+
+    shutil.rmtree(partition, ignore_errors=True)
+    staging.rename(partition)
+
+    return partition
+
+
+def read_partition(partition, columns: list | None = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Loads one year (one partition folder) of the panel.
+
+    Args:
+    partition (str | Path): The partition folder, e.g. consumption_panel/Year=2019.
+    columns (list | None): Panel columns to load, or None for all of them.
+    compact (bool): Use the smaller types of COMPACT_DTYPES.
+
+    Returns:
+    pd.DataFrame: The rows of that year.
+    """
+    parquet_file = Path(partition) / "part.parquet"
+
+    if HAS_PYARROW and parquet_file.exists():
+        df = pd.read_parquet(parquet_file, columns=columns)
+    else:
+        df = to_typed_frame(pd.read_csv(Path(partition) / "part.csv", dtype=str, usecols=columns))
+
+    return to_compact_frame(df) if compact else df
+
+
+def combine_years(frames: list[pd.DataFrame], columns: list | None = None) -> pd.DataFrame:
+    """
+    Stacks yearly frames (each with a Year column) into one long-format frame.
+
+    Args:
+    frames (list[pd.DataFrame]): The yearly frames.
+    columns (list | None): Columns of the empty frame returned when there are no frames.
+
+    Returns:
+    pd.DataFrame: All rows with an int16 Year column.
+    """
+    if not frames:
+        return pd.DataFrame(columns=(columns or PANEL_COLUMNS) + ["Year"])
+
+    # Postcode categories differ between years, so combine them with union_categoricals
+    # (a plain concat would turn the column back into strings)
+    postcodes = None
+    if "Postcode" in frames[0].columns:
+        postcodes = pd.api.types.union_categoricals([df.pop("Postcode") for df in frames])
+
+    panel = pd.concat(frames, ignore_index=True)
+    if postcodes is not None:
+        panel.insert(0, "Postcode", postcodes)
+    panel["Year"] = panel["Year"].astype("int16")
+    return panel
+
+
+def read_panel(panel_dir, years=None, columns: list | None = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Loads the multi-year panel in long format (one row per postcode and year).
+
+    Only the partitions of the requested years are read.
+
+    Args:
+    panel_dir (str | Path): The panel folder.
+    years (iterable | None): Years to load, e.g. range(2019, 2023), or None for all of them.
+    columns (list | None): Panel columns to load, or None for all of them.
+    compact (bool): Use the smaller types of COMPACT_DTYPES.
+
+    Returns:
+    pd.DataFrame: The panel rows with a Year column added.
+    """
+    stored = panel_years(panel_dir)
+    if years is not None:
+        wanted = set(years)
+        stored = [year for year in stored if year in wanted]
+
+    frames = []
+    for year in stored:
+        df = read_partition(panel_partition(panel_dir, year), columns, compact)
+        df["Year"] = year
+        frames.append(df)
+
+    return combine_years(frames, columns)
+
+
+def load_years(csv_paths: dict, columns: list | None = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Loads several years of cleaned data in long format, ready for a single join and groupby.
+
+    Each year is read from the panel next to its CSV file (clean_data/consumption_panel)
+    when that partition is up to date, otherwise from the yearly file. Columns a year
+    does not have are left empty.
+
+    Args:
+    csv_paths (dict): Year -> path to clean_data/electricity_scotland_{year}.csv.
+    columns (list | None): Panel columns to load, or None for all of them.
+    compact (bool): Use the smaller types of COMPACT_DTYPES (float32 kWh, so totals
+                    aggregated from them are rounded; keep False for written results).
+
+    Returns:
+    pd.DataFrame: The rows of every year with a Year column added.
+    """
+    columns = PANEL_COLUMNS if columns is None else columns
+
+    frames = []
+    for year, csv_path in sorted(csv_paths.items()):
+        csv_path = Path(csv_path)
+        partition = panel_partition(csv_path.parent / PANEL_DIR_NAME, year)
+
+        if year in panel_years(partition.parent) and partition.stat().st_mtime >= csv_path.stat().st_mtime:
+            df = read_partition(partition, columns, compact)
+        else:
+            # The key is computed from the postcodes, so read those too if the key is wanted
+            wanted = columns + ["Postcode"] if "Postcode_Key" in columns else columns
+            available = get_schema(csv_path)
+            df = read_clean_year(csv_path, list(dict.fromkeys(c for c in wanted if c in available)))
+            if "Postcode_Key" in columns:
+                df["Postcode_Key"] = encode_postcodes(df["Postcode"])
+            df = df.reindex(columns=columns)
+            if compact:
+                df = to_compact_frame(df)
+
+        df["Year"] = year
+        frames.append(df)
+
+    return combine_years(frames, columns)
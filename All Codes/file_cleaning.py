@@ -5,16 +5,59 @@ This code file gets data stored for analysis from the urls
 
 import pandas as pd
 from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import urllib.request
+import codecs
+import hashlib
+import inspect
+import json
+import mmap
+import io
 import re
 import os
 
+import electricity_store
+import postcodes
+import schema_registry
+from download_cache import RAW_CACHE_DIR, fetch, load_entry
+from electricity_store import (HAS_PYARROW, PANEL_DIR_NAME, panel_partition, read_clean_year, store_path,
+                               write_clean_store, write_panel_year)
+
 OUTPUT_DIR = "clean_data"
 
+# Memory ceiling (in MB) for the streaming ingest of one UK-wide file
+MAX_MEMORY_MB = 256
+
+# Rows parsed up front to measure how much memory one row takes
+SAMPLE_ROWS = 5000
+
+# Number of years cleaned at the same time (None means one process per CPU core).
+# Each process has its own MAX_MEMORY_MB ceiling, so keep WORKERS * MAX_MEMORY_MB within the machine's RAM.
+WORKERS = None
+
+# Bump this when the cleaned output should change for a reason the code fingerprint
+# (see filter_fingerprint) cannot see, e.g. a pandas upgrade that parses numbers differently
+FILTER_VERSION = 1
+
+# Build manifest (inside OUTPUT_DIR) recording how each year's output was made
+MANIFEST_NAME = "manifest.json"
+
+# A parsed chunk briefly coexists with its filtered copy and the parser buffers
+MEMORY_OVERHEAD = 3
+
 # Set of Postcode Area prefixes belonging to Scotland
 SCOT_AREAS = ["AB", "DD", "DG", "EH", "FK", "G", "HS", "IV", 
               "KA", "KW", "KY", "ML", "PA", "PH", "TD", "ZE"]
 
+# Raw CSV lines whose first field (the Outcode) starts with a Scottish area followed by a digit.
+# The digit stops "G" from also matching English areas such as "GL" or "GU".
+SCOT_LINE_RE = re.compile(rb'^"?(?:' + b"|".join(area.encode() for area in SCOT_AREAS) + rb')[0-9][^\n]*\n?', re.M)
+
 
+# Raw columns are kept as text, except Outcode which is parsed straight into categorical codes
+# so filter_scotland_chunk can look areas up per distinct outcode
+RAW_DTYPES = defaultdict(lambda: str, Outcode="category")
 
 # Direct download URLs for UK electricity consumption data (2015-2023)
 DATA_URLS = {
@@ -38,18 +81,282 @@ def filter_scotland_chunk(dataset):
     """
     Filters a dataframe to retain only rows corresponding to Scottish postcodes.
 
+    The postcode area is looked up once per distinct Outcode and gathered to the rows
+    through categorical codes (see postcodes.in_areas), instead of stripping digits
+    from every row.
+
     Input: Dataset of all electricity data across UK with outcode information
 
-    Returns: A copy of the dataframe containing only Scottish records.
+    Returns: A dataframe containing only Scottish records.
+    """
+
+    return dataset[postcodes.in_areas(dataset['Outcode'], SCOT_AREAS)]
+
+def rows_per_chunk(sample, max_memory_mb=MAX_MEMORY_MB):
+    """
+    Works out how many rows can be parsed at once without going over the memory ceiling.
+
+    Input: A sample chunk of the raw data and the memory ceiling in MB
+
+    Returns: The number of rows to read per chunk (at least 1000).
+    """
+
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    budget = max_memory_mb * 1024 * 1024 / MEMORY_OVERHEAD
+    return max(int(budget // max(bytes_per_row, 1)), 1000)
+
+def iter_raw_blocks(source, block_size):
+    """
+    Reads a local file or URL as raw bytes in blocks that always end on a line break.
+
+    Local files are memory-mapped so blocks are sliced straight from the page cache,
+    while URLs are read from the HTTP response as it arrives.
+
+    Input: A URL or local path and the approximate block size in bytes
+
+    Returns: A generator of byte blocks, the first one starting with the header line.
+    """
+
+    if os.path.exists(source):
+        with open(source, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = 0
+                while start < len(mapped):
+                    end = mapped.find(b"\n", start + block_size)
+                    end = len(mapped) if end == -1 else end + 1
+                    yield mapped[start:end]
+                    start = end
+        return
+
+    with urllib.request.urlopen(source) as response:
+        carry = b""
+        while True:
+            data = response.read(block_size)
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            carry = data[cut:]
+            if cut:
+                yield data[:cut]
+        if carry:
+            yield carry
+
+def prefilter_scottish_lines(block):
+    """
+    Keeps only the raw CSV lines that start with a Scottish Outcode.
+
+    Input: A block of raw CSV lines (without the header)
+
+    Returns: The matching lines joined back into a single block.
+    """
+
+    return b"".join(SCOT_LINE_RE.findall(block))
+
+def stream_prefiltered_rows(source, max_memory_mb=MAX_MEMORY_MB):
+    """
+    Scans the raw bytes of a UK-wide CSV and parses only the lines with a Scottish Outcode.
+
+    Input: A URL or local path to the UK data and the memory ceiling in MB
+
+    Returns: A generator of dataframes containing only Scottish records.
+    """
+
+    block_size = max_memory_mb * 1024 * 1024 // MEMORY_OVERHEAD
+    header = None
+    parsed_any = False
+
+    for block in iter_raw_blocks(source, block_size):
+        if header is None:
+            # A UTF-8 byte order mark would hide the first column name (pandas drops it too)
+            if block.startswith(codecs.BOM_UTF8):
+                block = block[len(codecs.BOM_UTF8):]
+            cut = block.find(b"\n") + 1 or len(block)
+            header, block = block[:cut], block[cut:]
+
+            # The byte scan relies on the Outcode being the first column; otherwise let pandas filter every row
+            if header.lstrip(b'"').split(b",")[0].strip().strip(b'"').lower() != b"outcode":
+                yield from stream_scottish_rows(source, max_memory_mb, prefilter=False)
+                return
+
+            if not header.endswith(b"\n"):
+                header += b"\n"
+
+        matched = prefilter_scottish_lines(block)
+        if not matched and parsed_any:
+            continue
+
+        parsed_any = True
+        chunk = pd.read_csv(io.BytesIO(header + matched), dtype=RAW_DTYPES)
+        # Confirm with the row-level filter so the output matches the pandas-only path exactly
+        yield filter_scotland_chunk(chunk)
+
+def stream_scottish_rows(source, max_memory_mb=MAX_MEMORY_MB, prefilter=True):
+    """
+    Reads a UK-wide CSV chunk by chunk and yields only the Scottish rows.
+
+    With prefilter=True the raw lines are scanned first (see stream_prefiltered_rows) and
+    only Scottish lines reach the CSV parser. Otherwise the first SAMPLE_ROWS rows are used
+    to measure the memory cost of a row, and the chunk size is then picked so each chunk
+    stays under max_memory_mb.
+
+    Input: A URL or local path to the UK data, the memory ceiling in MB and the prefilter switch
+
+    Returns: A generator of dataframes containing only Scottish records.
+    """
+
+    if prefilter:
+        yield from stream_prefiltered_rows(source, max_memory_mb)
+        return
+
+    with pd.read_csv(source, dtype=RAW_DTYPES, iterator=True) as reader:
+        try:
+            chunk = reader.get_chunk(SAMPLE_ROWS)
+        except StopIteration:
+            return
+        chunk_rows = rows_per_chunk(chunk, max_memory_mb)
+
+        while True:
+            yield filter_scotland_chunk(chunk)
+            try:
+                chunk = reader.get_chunk(chunk_rows)
+            except StopIteration:
+                return
+
+def write_scottish_csv(source, filename, max_memory_mb=MAX_MEMORY_MB, prefilter=True):
+    """
+    Streams the Scottish rows of a UK-wide CSV into a local CSV file.
+
+    Rows are written to a temporary ".part" file which is only renamed once the
+    whole source has been read, so a failed download never looks like a finished file.
+
+    Input: A URL or local path to the UK data, the output filename, the memory ceiling in MB
+           and whether to use the raw-line prefilter
+
+    Returns: The number of Scottish rows written.
+    """
+
+    partial = f"{filename}.part"
+    total_rows = 0
+    first_chunk = True
+
+    for scot_data in stream_scottish_rows(source, max_memory_mb, prefilter):
+        # Write the header with the first chunk even if it has no Scottish rows
+        if first_chunk or not scot_data.empty:
+            scot_data.to_csv(partial, index=False, mode='w' if first_chunk else 'a', header=first_chunk)
+            total_rows += len(scot_data)
+            first_chunk = False
+
+    os.replace(partial, filename)
+    return total_rows
+
+def filter_fingerprint():
     """
+    Fingerprints everything that decides what ends up in the cleaned files.
 
-    clean_dataset = dataset.copy()
-    clean_dataset['City Code'] = clean_dataset['Outcode'].str.strip('0123456789')
-    clean_dataset= clean_dataset[clean_dataset['City Code'].isin(SCOT_AREAS)]
-    clean_dataset = clean_dataset.drop(['City Code'],axis =1)
-    return clean_dataset
+    This covers FILTER_VERSION, SCOT_AREAS, the raw-line pattern, the source code of
+    the filter functions, the schema rules and the column types of the typed store,
+    so editing any of them marks every year as out of date.
 
-def get_scottish_data(year, url):
+    Input: None
+
+    Returns: A short hex string.
+    """
+
+    parts = [
+        str(FILTER_VERSION),
+        ",".join(sorted(SCOT_AREAS)),
+        SCOT_LINE_RE.pattern.decode(),
+        inspect.getsource(filter_scotland_chunk),
+        inspect.getsource(postcodes.area_table),
+        inspect.getsource(postcodes.in_areas),
+        inspect.getsource(postcodes.pack_postcodes),
+        inspect.getsource(postcodes.encode_postcodes),
+        inspect.getsource(electricity_store.write_panel_year),
+        inspect.getsource(prefilter_scottish_lines),
+        inspect.getsource(electricity_store.to_typed_frame),
+        inspect.getsource(electricity_store.read_csv_columns),
+        inspect.getsource(schema_registry),
+        json.dumps(electricity_store.CLEAN_DTYPES, sort_keys=True),
+        json.dumps(electricity_store.PANEL_COLUMNS),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+def load_manifest(folder=OUTPUT_DIR):
+    """
+    Reads the build manifest of the cleaning stage.
+
+    Input: The folder holding the cleaned data
+
+    Returns: A dictionary of year (as a string) -> manifest entry, empty if there is no manifest yet.
+    """
+
+    manifest_file = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+def save_manifest(manifest, folder=OUTPUT_DIR):
+    """
+    Writes the build manifest atomically.
+
+    Input: The manifest dictionary and the folder holding the cleaned data
+
+    Returns: None
+    """
+
+    manifest_file = os.path.join(folder, MANIFEST_NAME)
+    with open(f"{manifest_file}.part", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{manifest_file}.part", manifest_file)
+
+def year_outputs(year, folder=OUTPUT_DIR):
+    """
+    Lists the files and folders the cleaning stage produces for one year.
+
+    Input: The year and the folder holding the cleaned data
+
+    Returns: A list of paths.
+    """
+
+    filename = os.path.join(folder, f"electricity_scotland_{year}.csv")
+    outputs = [filename, str(panel_partition(os.path.join(folder, PANEL_DIR_NAME), year))]
+    if HAS_PYARROW:
+        outputs.append(str(store_path(filename)))
+    return outputs
+
+def is_up_to_date(year, url, manifest, folder=OUTPUT_DIR, raw_dir=RAW_CACHE_DIR, fingerprint=None):
+    """
+    Checks whether a year's outputs can be reused without rebuilding them.
+
+    A year is up to date when the manifest says it was built from the same URL, with
+    the same filter fingerprint, from the raw file that is in the download cache now,
+    and all of its outputs still exist. No network access is needed.
+
+    Input: The year, its URL, the loaded manifest, the output folder, the raw cache folder
+           and (optionally) a precomputed filter fingerprint
+
+    Returns: True if the year does not need to be rebuilt.
+    """
+
+    entry = manifest.get(str(year))
+    if not entry or entry.get("url") != url:
+        return False
+    if entry.get("filter_version") != (fingerprint or filter_fingerprint()):
+        return False
+
+    # If the raw file was downloaded again and changed, the output is stale.
+    # A deleted raw cache does not count as a change.
+    cached = load_entry(url, raw_dir) if url else None
+    if cached and cached["sha256"] != entry.get("source_sha256"):
+        return False
+
+    return all(os.path.exists(path) for path in year_outputs(year, folder))
+
+def get_scottish_data(year, url, max_memory_mb=MAX_MEMORY_MB, raw_dir=RAW_CACHE_DIR):
 
     # Folder where files will be saved
     folder = "clean_data"
@@ -61,24 +368,125 @@ def get_scottish_data(year, url):
     filename = f"{folder}/electricity_scotland_{year}.csv"
 
 
-    # If file already exists, load and return it
-    if os.path.exists(filename):
+    # If the manifest says the file was built from the same source with the same filter, reuse it
+    manifest = load_manifest(folder)
+    if is_up_to_date(year, url, manifest, folder, raw_dir):
         print(f"[{year}] We already have the file!")
-        data = pd.read_csv(filename, dtype=str)
-        return data
     else: 
-        df = pd.read_csv(url, dtype=str, low_memory=False)
-        scot_data = filter_scotland_chunk(df)
-        scot_data.to_csv(filename, index=False)
-        return pd.read_csv(filename, dtype=str)
+        # Download the UK file once into the raw cache, then stream it in chunks
+        # so only the Scottish rows are ever held in memory
+        manifest[str(year)] = clean_year(year, url, folder, max_memory_mb, raw_dir)
+        save_manifest(manifest, folder)
+        print(f"[{year}] Saved {manifest[str(year)]['rows']} Scottish rows to {filename}")
+
+    # Read the typed Parquet copy instead of re-parsing the CSV
+    return read_clean_year(filename)
+
+
+def clean_year(year, url, folder=OUTPUT_DIR, max_memory_mb=MAX_MEMORY_MB, raw_dir=RAW_CACHE_DIR):
+    """
+    Cleans a single year into folder/electricity_scotland_{year}.csv, its typed Parquet copy
+    and its partition of the multi-year panel.
+
+    Unlike get_scottish_data this does not load the result back, so it is cheap to run
+    inside a worker process. Errors are raised rather than printed so the caller can
+    report them per year.
+
+    The raw UK file is taken from (or downloaded into) the raw_dir cache, so a re-run
+    after a crash or a change to the filter does not download it again.
+
+    Input: The year, its download URL, the output folder, the memory ceiling in MB
+           and the raw download cache folder
+
+    Returns: The manifest entry for the year (URL, source checksum, filter fingerprint, row count).
+    """
+
+    if not url or "http" not in url:
+        raise RuntimeError(f"No valid URL configured for {year}")
+
+    filename = os.path.join(folder, f"electricity_scotland_{year}.csv")
+
+    try:
+        raw_path = fetch(url, raw_dir)
+        total_rows = write_scottish_csv(raw_path, filename, max_memory_mb)
+        write_clean_store(filename)
+        write_panel_year(filename, year, os.path.join(folder, PANEL_DIR_NAME))
+    except Exception as e:
+        # Some errors (e.g. HTTPError) cannot be sent back from a worker process, so pass on the message only
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+    return {
+        "url": url,
+        "source_sha256": load_entry(url, raw_dir)["sha256"],
+        "filter_version": filter_fingerprint(),
+        "rows": total_rows,
+    }
+
+def clean_all_years(years=None, workers=WORKERS, folder=OUTPUT_DIR, max_memory_mb=MAX_MEMORY_MB,
+                    raw_dir=RAW_CACHE_DIR):
+    """
+    Cleans several years in parallel, one year per worker process.
+
+    Years that the build manifest shows are up to date are skipped. Progress is printed
+    as each year finishes. A year that fails is reported and recorded but does not stop
+    the other years from being cleaned.
+
+    Input: The years to clean (default: all of DATA_URLS), the number of worker processes,
+           the output folder, the per-worker memory ceiling in MB and the raw download cache folder
+
+    Returns: A dictionary of year -> rows written (None if up to date) for the years that
+             succeeded, and a dictionary of year -> error message for the years that failed.
+    """
+
+    years = sorted(DATA_URLS) if years is None else list(years)
+    os.makedirs(folder, exist_ok=True)
+
+    done = {}
+    failed = {}
+
+    # Years whose source, filter and outputs are unchanged are skipped without starting a worker
+    manifest = load_manifest(folder)
+    fingerprint = filter_fingerprint()
+    stale = []
+    for year in years:
+        if is_up_to_date(year, DATA_URLS.get(year), manifest, folder, raw_dir, fingerprint):
+            done[year] = None
+            print(f"[{year}] Up to date, skipped")
+        else:
+            stale.append(year)
+
+    if not stale:
+        return done, failed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(clean_year, year, DATA_URLS.get(year), folder, max_memory_mb, raw_dir): year for year in stale}
+
+        for count, future in enumerate(as_completed(futures), start=1):
+            year = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed[year] = str(e)
+                print(f"[{year}] Failed ({count}/{len(stale)}): {failed[year]}")
+                continue
+
+            # Only this process writes the manifest, after every finished year
+            manifest[str(year)] = entry
+            save_manifest(manifest, folder)
+
+            done[year] = entry["rows"]
+            print(f"[{year}] Saved {entry['rows']} Scottish rows ({count}/{len(stale)})")
+
+    return done, failed
 
 
 if __name__ == "__main__":
 
-    for year in range(2015, 2024):
-        url = DATA_URLS.get(year)
-        get_scottish_data(year, url)
+    done, failed = clean_all_years()
 
-    print("All files downloaded for analysis.")    
+    if failed:
+        print(f"Finished with {len(failed)} failed year(s): {sorted(failed)}")
+    else:
+        print("All files downloaded for analysis.")    
 
 
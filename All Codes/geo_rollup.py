@@ -0,0 +1,407 @@
+"""
+Geography rollup cube of the Scottish electricity data.
+
+Kilowatt-hours and meter counts are additive, so they only have to be summed
+over postcodes once, at the finest geography (DataZone). Intermediate Zone and
+council totals are then sums of those DataZone sums instead of new passes over
+the postcode rows.
+
+build_cube does this for all 32 councils and every year at once and returns a
+long table with one row per level, area and year:
+
+    Level | Year | Council_Code | IntermediateZone | DataZone | Postcodes | Num_meters | Total_cons_kwh
+          | Mean_cons_kwh | P10_cons_kwh | Median_cons_kwh | P90_cons_kwh
+
+Each row keeps the codes of the areas above it (a DataZone row also names its
+Intermediate Zone and council), so query_cube can select e.g. the DataZones
+of a few councils. Mean_cons_kwh is the meter-weighted mean (total kWh /
+meters), exact from the sums. Medians and percentiles are not additive; they
+come from quantile sketches (see quantile_sketch.py) built per DataZone and
+merged up the levels, so they are approximate (within 1%) and describe the
+postcode medians weighted by their meters. The cube is saved next to the
+cleaned data as geography_cube.parquet (or .csv without pyarrow), together
+with the DataZone sketches (geography_sketch.parquet).
+
+Tables of DataZone results for all councils can be saved partitioned by
+council and year (Council_Code={code}/Year={year} folders, like the panel in
+electricity_store.py), so a query for one council only opens that council's
+folders (read_council_partitions).
+
+Run this file to (re)build the cube from the cleaned data and the SSPL index.
+
+"""
+
+import shutil
+import sys
+import pandas as pd
+from pathlib import Path
+
+from electricity_store import HAS_PYARROW, load_years
+from quantile_sketch import build_sketch, merge_sketches, sketch_quantiles
+from sspl_index import ensure_sspl_index, lookup_keys
+
+# Geography levels from finest to coarsest, with the codes that identify an area on each level
+ROLLUP_LEVELS = {
+    "DataZone": ["Council_Code", "IntermediateZone", "DataZone"],
+    "IntermediateZone": ["Council_Code", "IntermediateZone"],
+    "Council": ["Council_Code"],
+}
+
+# Additive columns summed up the levels
+SUM_COLUMNS = ["Postcodes", "Num_meters", "Total_cons_kwh"]
+
+# Approximate percentiles of kWh per meter, read from the quantile sketches
+QUANTILES = {"P10_cons_kwh": 0.1, "Median_cons_kwh": 0.5, "P90_cons_kwh": 0.9}
+
+# DataZone / Intermediate Zone boundaries to use ("2011" or "2022")
+ZONE_VINTAGE = "2022"
+
+# File names of the saved cube and DataZone sketches (inside clean_data)
+CUBE_NAME = "geography_cube"
+SKETCH_NAME = "geography_sketch"
+
+# Columns whose values name the partition folders of a council table
+PARTITION_KEYS = ["Council_Code", "Year"]
+
+# Default locations when run as a script
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CLEAN_DATA_DIR = PROJECT_ROOT / "cleaning data with code" / "clean_data"
+SSPL_FILE = PROJECT_ROOT / "council area with elec consumption" / "Scottish_Postcode_Lookup_2025_1.csv"
+
+
+def attach_geography(panel: pd.DataFrame, index: dict, vintage: str = ZONE_VINTAGE) -> pd.DataFrame:
+    """
+    Adds council, Intermediate Zone and DataZone codes to postcode rows in a single join.
+
+    Args:
+    panel (pd.DataFrame): Postcode rows with a Postcode_Key column (e.g. from load_years).
+    index (dict): A loaded SSPL index.
+    vintage (str): Zone boundaries to use, "2011" or "2022".
+
+    Returns:
+    pd.DataFrame: The panel with Council_Code, IntermediateZone and DataZone columns added.
+    """
+    geo = lookup_keys(index, panel["Postcode_Key"],
+                      ["Council_Code", f"IntermediateZone{vintage}", f"DataZone{vintage}"])
+
+    return panel.assign(
+        Council_Code=geo["Council_Code"],
+        IntermediateZone=geo[f"IntermediateZone{vintage}"],
+        DataZone=geo[f"DataZone{vintage}"],
+    )
+
+
+def build_rollup(panel: pd.DataFrame, index: dict, vintage: str = ZONE_VINTAGE) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Sums and sketches the postcode rows per DataZone once and rolls both up to every coarser level.
+
+    Postcodes that are not in the SSPL are left out. Postcodes whose DataZone is
+    unknown still count towards their Intermediate Zone and council.
+
+    Args:
+    panel (pd.DataFrame): Postcode rows with Year, Postcode_Key, Num_meters and Total_cons_kwh
+                          (and optionally Mean_cons_kwh / Median_cons_kwh).
+    index (dict): A loaded SSPL index.
+    vintage (str): Zone boundaries to use, "2011" or "2022".
+
+    Returns:
+    tuple[pd.DataFrame, pd.DataFrame]: The cube (one row per level, area and year)
+                                       and the DataZone sketches it was rolled up from.
+    """
+    rows = attach_geography(panel, index, vintage)
+    rows = pd.DataFrame({
+        "Year": rows["Year"],
+        "Council_Code": rows["Council_Code"],
+        "IntermediateZone": rows["IntermediateZone"],
+        "DataZone": rows["DataZone"],
+        "Postcodes": 1,
+        "Num_meters": rows["Num_meters"].fillna(0).astype("int64"),
+        "Total_cons_kwh": rows["Total_cons_kwh"].fillna(0).astype("float64"),
+        "Typical_kwh": typical_consumption(rows),
+    })
+    rows = rows[rows["Council_Code"].notna()]
+
+    # The only passes over the postcode rows
+    finest_keys = ["Year"] + ROLLUP_LEVELS["DataZone"]
+    finest = rows.groupby(finest_keys, observed=True, dropna=False)[SUM_COLUMNS].sum().reset_index()
+    sketch = build_sketch(rows, finest_keys, "Typical_kwh", "Num_meters")
+
+    tables = []
+    for level, keys in ROLLUP_LEVELS.items():
+        if level == "DataZone":
+            table = finest
+        else:
+            table = finest.groupby(["Year"] + keys, observed=True, dropna=False)[SUM_COLUMNS].sum().reset_index()
+        table = table.merge(rollup_quantiles(sketch, level), on=["Year"] + keys, how="left")
+
+        # Rows without a code on this level only feed the coarser levels
+        table = table[table[keys[-1]].notna()]
+        tables.append(table.assign(Level=level))
+
+    cube = pd.concat(tables, ignore_index=True)
+    cube = cube[["Level", "Year"] + ROLLUP_LEVELS["DataZone"] + SUM_COLUMNS + list(QUANTILES)]
+    for col in ["Level"] + ROLLUP_LEVELS["DataZone"]:
+        cube[col] = cube[col].astype("category")
+    # Meter-weighted mean, exact from the sums
+    cube.insert(len(cube.columns) - len(QUANTILES), "Mean_cons_kwh",
+                cube["Total_cons_kwh"] / cube["Num_meters"].where(cube["Num_meters"] > 0))
+
+    return cube, sketch
+
+
+def build_cube(panel: pd.DataFrame, index: dict, vintage: str = ZONE_VINTAGE) -> pd.DataFrame:
+    """
+    Builds the rollup cube (see build_rollup) without keeping the sketches.
+
+    Args:
+    panel (pd.DataFrame): Postcode rows with Year, Postcode_Key, Num_meters and Total_cons_kwh.
+    index (dict): A loaded SSPL index.
+    vintage (str): Zone boundaries to use, "2011" or "2022".
+
+    Returns:
+    pd.DataFrame: The cube, one row per level, area and year.
+    """
+    return build_rollup(panel, index, vintage)[0]
+
+
+def typical_consumption(rows: pd.DataFrame) -> pd.Series:
+    """
+    Returns the typical kWh per meter of every postcode, the value the quantile sketches describe.
+
+    The postcode median is used where the data has one, then the postcode mean,
+    then total kWh / meters.
+
+    Args:
+    rows (pd.DataFrame): Postcode rows.
+
+    Returns:
+    pd.Series: kWh per meter.
+    """
+    meters = rows["Num_meters"].astype("float64")
+    value = rows["Total_cons_kwh"].astype("float64") / meters.where(meters > 0)
+    for col in ["Mean_cons_kwh", "Median_cons_kwh"]:
+        if col in rows.columns:
+            value = rows[col].astype("float64").fillna(value)
+    return value
+
+
+def rollup_quantiles(sketch: pd.DataFrame, level: str, quantiles: dict = QUANTILES) -> pd.DataFrame:
+    """
+    Computes approximate quantiles for one level from DataZone sketches.
+
+    Args:
+    sketch (pd.DataFrame): DataZone sketches from build_rollup or load_sketch.
+    level (str): "DataZone", "IntermediateZone" or "Council".
+    quantiles (dict): Output column -> quantile.
+
+    Returns:
+    pd.DataFrame: One row per area and year with the quantile columns.
+    """
+    keys = ["Year"] + ROLLUP_LEVELS[level]
+    return sketch_quantiles(merge_sketches(sketch, keys), keys, quantiles)
+
+
+def query_cube(cube: pd.DataFrame, level: str, years=None, councils=None) -> pd.DataFrame:
+    """
+    Selects the rows of one level of the cube.
+
+    Args:
+    cube (pd.DataFrame): A cube from build_cube or load_cube.
+    level (str): "DataZone", "IntermediateZone" or "Council".
+    years (iterable | None): Years to keep, or None for all of them.
+    councils (iterable | None): Council codes to keep, or None for all of them.
+
+    Returns:
+    pd.DataFrame: The rows of that level, without the columns of finer levels.
+    """
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown level {level!r}, expected one of {list(ROLLUP_LEVELS)}")
+
+    rows = cube[cube["Level"] == level]
+    if years is not None:
+        rows = rows[rows["Year"].isin(list(years))]
+    if councils is not None:
+        rows = rows[rows["Council_Code"].isin(list(councils))]
+
+    finer = [c for c in ROLLUP_LEVELS["DataZone"] if c not in ROLLUP_LEVELS[level]]
+    rows = rows.drop(columns=["Level"] + finer)
+    for col in ROLLUP_LEVELS[level]:
+        rows[col] = rows[col].cat.remove_unused_categories()
+
+    return rows.reset_index(drop=True)
+
+
+def cube_path(clean_data_dir, name: str = CUBE_NAME) -> Path:
+    """
+    Returns where the cube (or the sketches) of a clean_data folder are saved.
+
+    Args:
+    clean_data_dir (str | Path): The clean_data folder.
+    name (str): CUBE_NAME or SKETCH_NAME.
+
+    Returns:
+    Path: e.g. geography_cube.parquet, or geography_cube.csv without pyarrow.
+    """
+    return Path(clean_data_dir) / (name + (".parquet" if HAS_PYARROW else ".csv"))
+
+
+def write_cube(cube: pd.DataFrame, path) -> Path:
+    """
+    Saves the cube (or the sketches).
+
+    Args:
+    cube (pd.DataFrame): The cube or sketches.
+    path (str | Path): Target file (.parquet or .csv).
+
+    Returns:
+    Path: The written file.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".part")
+
+    if path.suffix == ".parquet":
+        cube.to_parquet(partial, index=False)
+    else:
+        cube.to_csv(partial, index=False)
+    partial.replace(path)
+
+    return path
+
+
+def load_cube(path) -> pd.DataFrame:
+    """
+    Loads a saved cube (or the saved sketches).
+
+    Args:
+    path (str | Path): The cube or sketch file (.parquet or .csv).
+
+    Returns:
+    pd.DataFrame: The cube or sketches with categorical codes.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+
+    dtypes = dict.fromkeys(["Level"] + ROLLUP_LEVELS["DataZone"], "category")
+    return pd.read_csv(path, dtype=dtypes)
+
+
+def council_partition(table_dir, council_code: str, year: int) -> Path:
+    """
+    Returns the folder holding one council and year of a partitioned table.
+
+    Args:
+    table_dir (str | Path): The table folder.
+    council_code (str): e.g. "S12000049".
+    year (int): The year of the partition.
+
+    Returns:
+    Path: table_dir/Council_Code={council_code}/Year={year}.
+    """
+    return Path(table_dir) / f"Council_Code={council_code}" / f"Year={year}"
+
+
+def write_council_partitions(table: pd.DataFrame, table_dir) -> Path:
+    """
+    Saves a table (e.g. the DataZone rows of all councils) partitioned by council and year.
+
+    The whole table is written to a temporary folder and swapped in at the end,
+    so readers never see a mix of old and new partitions.
+
+    Args:
+    table (pd.DataFrame): Rows with Council_Code and Year columns.
+    table_dir (str | Path): The table folder (replaced if it exists).
+
+    Returns:
+    Path: The table folder.
+    """
+    table_dir = Path(table_dir)
+    staging = table_dir.with_name(table_dir.name + ".part")
+    shutil.rmtree(staging, ignore_errors=True)
+
+    # The partition folders name the keys, so the files only hold the other columns
+    table = table.astype({col: str for col in table.columns if isinstance(table[col].dtype, pd.CategoricalDtype)})
+    for (council_code, year), rows in table.groupby(PARTITION_KEYS, sort=False):
+        partition = council_partition(staging, council_code, year)
+        partition.mkdir(parents=True)
+        rows = rows.drop(columns=PARTITION_KEYS)
+        if HAS_PYARROW:
+            rows.to_parquet(partition / "part.parquet", index=False)
+        else:
+            rows.to_csv(partition / "part.csv", index=False)
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    staging.rename(table_dir)
+
+    return table_dir
+
+
+def read_council_partitions(table_dir, councils, years=None) -> pd.DataFrame:
+    """
+    Loads the rows of some councils from a partitioned table, opening only their folders.
+
+    Args:
+    table_dir (str | Path): The table folder.
+    councils (iterable): Council codes to load.
+    years (iterable | None): Years to load, or None for all stored years.
+
+    Returns:
+    pd.DataFrame: The rows with the Council_Code and Year columns added back.
+    """
+    frames = []
+    for council_code in councils:
+        council_dir = Path(table_dir) / f"Council_Code={council_code}"
+        if years is None:
+            stored = sorted(int(p.name.split("=", 1)[1]) for p in council_dir.glob("Year=*"))
+        else:
+            stored = [year for year in years if council_partition(table_dir, council_code, year).is_dir()]
+
+        for year in stored:
+            partition = council_partition(table_dir, council_code, year)
+            parquet_file = partition / "part.parquet"
+            if HAS_PYARROW and parquet_file.exists():
+                rows = pd.read_parquet(parquet_file)
+            else:
+                rows = pd.read_csv(partition / "part.csv")
+            frames.append(rows.assign(Council_Code=council_code, Year=year))
+
+    if not frames:
+        return pd.DataFrame(columns=PARTITION_KEYS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_cube_from_files(clean_data_dir=CLEAN_DATA_DIR, sspl_file=SSPL_FILE, years=range(2015, 2024),
+                          vintage: str = ZONE_VINTAGE) -> pd.DataFrame:
+    """
+    Builds the cube from the cleaned yearly data and the SSPL, and saves it and its
+    DataZone sketches in clean_data.
+
+    Args:
+    clean_data_dir (str | Path): The clean_data folder.
+    sspl_file (str | Path): The SSPL CSV (its index is built on the first run).
+    years (iterable): Years to include; years without a cleaned file are skipped.
+    vintage (str): Zone boundaries to use, "2011" or "2022".
+
+    Returns:
+    pd.DataFrame: The cube.
+    """
+    clean_data_dir = Path(clean_data_dir)
+    csv_paths = {year: clean_data_dir / f"electricity_scotland_{year}.csv" for year in years}
+    csv_paths = {year: path for year, path in csv_paths.items() if path.exists()}
+
+    panel = load_years(csv_paths, columns=["Postcode_Key", "Num_meters", "Total_cons_kwh", "Mean_cons_kwh", "Median_cons_kwh"])
+    cube, sketch = build_rollup(panel, ensure_sspl_index(sspl_file), vintage)
+
+    # The sketches let other quantiles or groupings be rolled up later without the postcode rows
+    write_cube(sketch, cube_path(clean_data_dir, SKETCH_NAME))
+    path = write_cube(cube, cube_path(clean_data_dir))
+    print(f"Saved cube with {len(cube)} rows for {len(csv_paths)} years to: {path}")
+    return cube
+
+
+if __name__ == "__main__":
+    if not CLEAN_DATA_DIR.exists() or not SSPL_FILE.exists():
+        print("Cleaned data or SSPL file not found. Please run the cleaning and council scripts first.")
+        sys.exit(1)
+
+    build_cube_from_files()
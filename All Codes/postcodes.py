@@ -0,0 +1,206 @@
+"""
+Postcode helpers shared by the cleaning and analysis scripts.
+
+A UK postcode such as "EH1 1AA" has an outcode ("EH1") whose leading letters
+are the postcode area ("EH"). There are only about 3,000 distinct outcodes, so
+instead of running string operations on every row, the area and region of each
+distinct outcode are worked out once in a small lookup table and applied to the
+rows through their categorical codes (an integer gather).
+
+Postcodes can also be packed into a single integer key (encode_postcodes) so
+joins compare int64 numbers instead of hashing strings. Keys sort in the same
+order as the normalised postcode strings and decode_postcodes turns them back.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+# Region given to postcode areas that are not listed in a region mapping
+OTHER_REGION = "Other UK"
+
+# Characters of a normalised postcode; a character's digit in the key is its position + 1
+# (0 pads postcodes shorter than POSTCODE_WIDTH, so keys sort like the strings)
+KEY_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Longest normalised postcode (e.g. "EH121AB")
+POSTCODE_WIDTH = 7
+
+# Key of postcodes that cannot be encoded (empty, too long or with other characters)
+MISSING_KEY = -1
+
+_KEY_BASE = len(KEY_ALPHABET) + 1
+_KEY_POWERS = _KEY_BASE ** np.arange(POSTCODE_WIDTH - 1, -1, -1, dtype="int64")
+
+# Byte value -> key digit, with -1 for bytes that are not in KEY_ALPHABET
+_KEY_DIGITS = np.full(256, -1, dtype="int64")
+_KEY_DIGITS[0] = 0
+_KEY_DIGITS[np.frombuffer(KEY_ALPHABET.encode(), dtype="uint8")] = np.arange(1, _KEY_BASE)
+
+
+def area_table(outcodes: pd.Index, regions: dict[str, str]) -> pd.DataFrame:
+    """
+    Builds the outcode -> postcode area -> region lookup table.
+
+    Args:
+    outcodes (pd.Index): The distinct outcodes (or postcodes) to look up.
+    regions (dict[str, str]): Mapping of postcode area to region, e.g. {"EH": "Scotland"}.
+
+    Returns:
+    pd.DataFrame: One row per outcode with its Area and Region.
+    """
+    outcodes = pd.Index(outcodes, dtype=str)
+    # Strip the district digits (and anything after them) to keep the leading area letters
+    areas = outcodes.str.strip().str.upper().str.extract(r"^([A-Z]+)", expand=False)
+
+    return pd.DataFrame({
+        "Outcode": outcodes,
+        "Area": areas,
+        "Region": areas.map(regions).fillna(OTHER_REGION),
+    })
+
+
+def as_categorical(values: pd.Series) -> pd.Series:
+    """
+    Returns the values as a categorical series, converting them only if needed.
+
+    Args:
+    values (pd.Series): Outcodes or postcodes.
+
+    Returns:
+    pd.Series: A categorical series with the same index.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    return values.astype("category")
+
+
+def lookup_regions(values: pd.Series, regions: dict[str, str]) -> pd.Series:
+    """
+    Looks up the region of every row through the categorical codes of its outcode.
+
+    Args:
+    values (pd.Series): Outcodes (or postcodes) of each row.
+    regions (dict[str, str]): Mapping of postcode area to region.
+
+    Returns:
+    pd.Series: A categorical series of regions with the same index as values.
+    """
+    values = as_categorical(values)
+    table = area_table(values.cat.categories, regions)
+
+    region_cats = pd.Index(sorted(set(table["Region"]) | {OTHER_REGION}))
+    table_codes = region_cats.get_indexer(table["Region"])
+    # Missing outcodes have code -1, which picks the appended OTHER_REGION entry
+    table_codes = np.append(table_codes, region_cats.get_loc(OTHER_REGION))
+
+    codes = table_codes[values.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=region_cats), index=values.index)
+
+
+def in_areas(values: pd.Series, areas) -> np.ndarray:
+    """
+    Tests which rows have an outcode in one of the given postcode areas.
+
+    The test runs once per distinct outcode and is then gathered to the rows by
+    categorical code, so it costs a few thousand string operations per call
+    instead of one per row.
+
+    Args:
+    values (pd.Series): Outcodes (or postcodes) of each row.
+    areas (iterable): Postcode areas to keep, e.g. SCOT_AREAS.
+
+    Returns:
+    np.ndarray: A boolean mask, True for rows in one of the areas.
+    """
+    values = as_categorical(values)
+    table = area_table(values.cat.categories, dict.fromkeys(areas, "selected"))
+
+    selected = (table["Region"] == "selected").to_numpy()
+    # Missing outcodes have code -1, which picks the appended False
+    selected = np.append(selected, False)
+
+    return selected[values.cat.codes.to_numpy()]
+
+
+def normalise_postcodes(postcodes: pd.Series) -> pd.Series:
+    """
+    Normalises postcodes to upper case without spaces, e.g. "eh1 1aa" -> "EH11AA".
+
+    Args:
+    postcodes (pd.Series): Postcodes in any format.
+
+    Returns:
+    pd.Series: The normalised postcodes as strings.
+    """
+    return postcodes.astype(str).str.replace(" ", "", regex=False).str.upper()
+
+
+def pack_postcodes(normalised: np.ndarray) -> np.ndarray:
+    """
+    Packs normalised postcode strings into integer keys.
+
+    Each character is one digit of a base-37 number, so a 7 character postcode
+    fits comfortably in an int64.
+
+    Args:
+    normalised (np.ndarray): Normalised postcodes (strings without spaces).
+
+    Returns:
+    np.ndarray: int64 keys, MISSING_KEY where a postcode cannot be encoded.
+    """
+    normalised = np.asarray(normalised, dtype=str)
+    too_long = np.char.str_len(normalised) > POSTCODE_WIDTH
+
+    chars = np.char.encode(normalised, "ascii", "replace").astype(f"S{POSTCODE_WIDTH}")
+    digits = _KEY_DIGITS[chars.view("uint8").reshape(-1, POSTCODE_WIDTH)]
+
+    keys = digits @ _KEY_POWERS
+    invalid = too_long | (digits < 0).any(axis=1) | (digits[:, 0] == 0)
+    keys[invalid] = MISSING_KEY
+    return keys
+
+
+def encode_postcodes(values: pd.Series) -> np.ndarray:
+    """
+    Encodes postcodes in any format as integer keys.
+
+    The postcodes are normalised and packed once per distinct value and gathered
+    to the rows through their categorical codes.
+
+    Args:
+    values (pd.Series): Postcodes of each row.
+
+    Returns:
+    np.ndarray: int64 keys, MISSING_KEY for missing or invalid postcodes.
+    """
+    values = as_categorical(values)
+    keys = pack_postcodes(normalise_postcodes(values.cat.categories.to_series()).to_numpy())
+    # Missing postcodes have code -1, which picks the appended MISSING_KEY
+    keys = np.append(keys, MISSING_KEY)
+
+    return keys[values.cat.codes.to_numpy()]
+
+
+def decode_postcodes(keys: np.ndarray, with_space: bool = False) -> np.ndarray:
+    """
+    Turns integer keys back into postcodes.
+
+    Args:
+    keys (np.ndarray): Keys made by encode_postcodes.
+    with_space (bool): Put the space back before the inward code ("EH1 1AA" instead of "EH11AA").
+
+    Returns:
+    np.ndarray: The postcodes as strings, empty where the key is MISSING_KEY.
+    """
+    keys = np.asarray(keys, dtype="int64")
+    digits = (keys[:, None] // _KEY_POWERS) % _KEY_BASE
+    digits[keys == MISSING_KEY] = 0
+
+    alphabet = np.frombuffer(b"\0" + KEY_ALPHABET.encode(), dtype="uint8")
+    postcodes = alphabet[digits].astype("uint8").view(f"S{POSTCODE_WIDTH}").ravel().astype(str)
+
+    if with_space:
+        postcodes = np.array([p[:-3] + " " + p[-3:] if len(p) > 3 else p for p in postcodes], dtype=str)
+
+    return postcodes
@@ -0,0 +1,133 @@
+"""
+Mergeable quantile sketches for consumption percentiles at any geography level.
+
+A median cannot be added up like kWh or meter counts: the median of a council
+is not a combination of the medians of its DataZones. A sketch keeps enough
+of the distribution to answer that question approximately.
+
+The sketch is a weighted histogram on logarithmic buckets (the DDSketch idea):
+a value x > 0 falls in bucket ceil(log(x) / log(gamma)) with
+gamma = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY), and every value of a
+bucket is within SKETCH_ACCURACY (relative) of the bucket's representative
+value. Two sketches are merged by adding the weights of equal buckets, so a
+sketch is just a long table (group keys, Bucket, Weight) and rolling it up to a
+coarser level is one groupby sum.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+# Relative accuracy of the quantiles (0.01 = within 1%)
+SKETCH_ACCURACY = 0.01
+
+# Bucket of values <= 0 (and their representative value 0)
+ZERO_BUCKET = np.iinfo("int32").min
+
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = np.log(_GAMMA)
+
+
+def value_buckets(values) -> np.ndarray:
+    """
+    Returns the sketch bucket of every value.
+
+    Args:
+    values (array-like): Non-negative values, e.g. kWh per meter.
+
+    Returns:
+    np.ndarray: int32 bucket numbers (ZERO_BUCKET for values <= 0).
+    """
+    values = np.asarray(values, dtype="float64")
+    positive = values > 0
+
+    buckets = np.full(len(values), ZERO_BUCKET, dtype="int32")
+    buckets[positive] = np.ceil(np.log(values[positive]) / _LOG_GAMMA)
+    return buckets
+
+
+def bucket_values(buckets) -> np.ndarray:
+    """
+    Returns the representative value of every bucket.
+
+    Args:
+    buckets (array-like): Bucket numbers from value_buckets.
+
+    Returns:
+    np.ndarray: Values within SKETCH_ACCURACY of every value in the bucket (0 for ZERO_BUCKET).
+    """
+    buckets = np.asarray(buckets, dtype="int64")
+    values = 2 * _GAMMA ** buckets.astype("float64") / (_GAMMA + 1)
+    values[buckets == ZERO_BUCKET] = 0.0
+    return values
+
+
+def build_sketch(frame: pd.DataFrame, keys: list, value_col: str, weight_col: str | None = None) -> pd.DataFrame:
+    """
+    Builds one sketch per group of rows.
+
+    Args:
+    frame (pd.DataFrame): The rows, e.g. one per postcode and year.
+    keys (list): Columns identifying a group, e.g. ["Year", "DataZone"].
+    value_col (str): The column whose distribution is sketched.
+    weight_col (str | None): Column with the weight of each row (e.g. Num_meters), or None for 1 per row.
+
+    Returns:
+    pd.DataFrame: The sketches as a long table: keys, Bucket, Weight.
+    """
+    values = frame[value_col].astype("float64")
+    weights = 1.0 if weight_col is None else frame[weight_col].astype("float64").fillna(0)
+
+    rows = frame[keys].assign(Bucket=value_buckets(values.fillna(0)), Weight=weights)
+    # Missing values and zero weights carry no information
+    rows = rows[values.notna().to_numpy() & (rows["Weight"] > 0).to_numpy()]
+
+    return rows.groupby(keys + ["Bucket"], observed=True, dropna=False)["Weight"].sum().reset_index()
+
+
+def merge_sketches(sketch: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """
+    Merges sketches into coarser groups (e.g. DataZone sketches into council sketches).
+
+    Args:
+    sketch (pd.DataFrame): Sketches from build_sketch or merge_sketches.
+    keys (list): Columns identifying the coarser groups.
+
+    Returns:
+    pd.DataFrame: The merged sketches: keys, Bucket, Weight.
+    """
+    return sketch.groupby(keys + ["Bucket"], observed=True, dropna=False)["Weight"].sum().reset_index()
+
+
+def sketch_quantiles(sketch: pd.DataFrame, keys: list, quantiles: dict) -> pd.DataFrame:
+    """
+    Reads approximate quantiles from sketches.
+
+    Args:
+    sketch (pd.DataFrame): Sketches with one group per combination of keys.
+    keys (list): Columns identifying a group.
+    quantiles (dict): Output column -> quantile, e.g. {"Median_cons_kwh": 0.5}.
+
+    Returns:
+    pd.DataFrame: One row per group with the keys and one column per quantile.
+    """
+    if sketch.empty:
+        return pd.DataFrame(columns=keys + list(quantiles))
+
+    sketch = sketch.sort_values(keys + ["Bucket"], ignore_index=True)
+    groups = sketch.groupby(keys, observed=True, dropna=False, sort=False)
+
+    # Rows are sorted, so every group is one contiguous run numbered 0, 1, 2, ...
+    group_ids = groups.ngroup().to_numpy()
+    cumulative = groups["Weight"].cumsum().to_numpy()
+    total = groups["Weight"].transform("sum").to_numpy()
+    values = bucket_values(sketch["Bucket"])
+
+    result = sketch.loc[np.r_[True, group_ids[1:] != group_ids[:-1]], keys].reset_index(drop=True)
+    for col, q in quantiles.items():
+        # The first bucket whose cumulative weight reaches the quantile (with slack for rounding)
+        reached = cumulative >= (q - 1e-9) * total
+        first = pd.Series(values[reached]).groupby(group_ids[reached]).first()
+        result[col] = first.reindex(range(len(result))).to_numpy()
+
+    return result
@@ -0,0 +1,191 @@
+"""
+Precomputed rankings of areas by every metric.
+
+The ranking tables and charts sort the same frames again for every metric
+they show. build_ranking_index sorts every metric column of a table once in
+both directions and keeps, per metric, the order of the rows (missing values
+last, ties in table order) and the rank of every row. Top-k and bottom-k
+queries then take a slice of the order, and the rank of an area is one array
+lookup, so nothing is sorted again, even for hundreds of thousands of
+postcodes.
+
+The index works for any table with one row per area (councils, Intermediate
+Zones, DataZones or postcodes); build_level_rankings builds one per
+geography level of the rollup cube (see geo_rollup.py). Only the metrics a
+caller passes are sorted, so pass the ones that are queried.
+save_ranking_index / load_ranking_index store an index as .npz.
+
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from geo_rollup import ROLLUP_LEVELS, query_cube
+
+# Cube columns ranked by build_level_rankings
+CUBE_METRICS = ["Num_meters", "Total_cons_kwh", "Mean_cons_kwh", "Median_cons_kwh"]
+
+
+def build_ranking_index(table: pd.DataFrame, metrics: list | None = None) -> dict:
+    """
+    Sorts every metric of a table once.
+
+    Args:
+    table (pd.DataFrame): One row per area (the index names the areas).
+    metrics (list | None): Columns to rank, or None for every numeric column.
+
+    Returns:
+    dict: "entities" (the table index), "metrics" (list), and per metric (one row each):
+          "order_largest" / "order_smallest" (row positions in rank order, missing values last),
+          "rank_largest" / "rank_smallest" (1-based position of every row in that order)
+          and "valid" (number of non-missing values).
+    """
+    if metrics is None:
+        metrics = list(table.select_dtypes("number").columns)
+
+    values = table[metrics].to_numpy(dtype="float64").T
+    positions = np.arange(1, len(table) + 1, dtype="int32")
+
+    index = {"entities": table.index, "metrics": list(metrics), "valid": (~np.isnan(values)).sum(axis=1)}
+    for direction, keys in [("smallest", values), ("largest", -values)]:
+        # numpy sorts NaN to the end and a stable sort keeps ties in table order
+        order = np.argsort(keys, axis=1, kind="stable").astype("int32")
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.broadcast_to(positions, order.shape), axis=1)
+        index[f"order_{direction}"], index[f"rank_{direction}"] = order, rank
+
+    return index
+
+
+def ranked_positions(index: dict, metric: str, largest: bool = True, k: int | None = None) -> np.ndarray:
+    """
+    Returns the row positions of the areas in rank order.
+
+    Args:
+    index (dict): A ranking index from build_ranking_index or load_ranking_index.
+    metric (str): The metric to rank by.
+    largest (bool): True for the largest value first, False for the smallest first.
+    k (int | None): Number of areas to return, or None for all of them (missing values last).
+
+    Returns:
+    np.ndarray: Row positions in the ranked table.
+    """
+    m = index["metrics"].index(metric)
+    order = index["order_largest" if largest else "order_smallest"][m]
+    return order if k is None else order[:k]
+
+
+def top_k(index: dict, metric: str, k: int, largest: bool = True) -> pd.Index:
+    """
+    Returns the k areas with the largest (or smallest) values of a metric.
+
+    Args:
+    index (dict): A ranking index.
+    metric (str): The metric to rank by.
+    k (int): Number of areas.
+    largest (bool): True for top-k, False for bottom-k.
+
+    Returns:
+    pd.Index: The areas in rank order.
+    """
+    return index["entities"][ranked_positions(index, metric, largest, k)]
+
+
+def rank_of(index: dict, metric: str, entities, largest: bool = True) -> pd.Series:
+    """
+    Returns the rank of some areas by a metric.
+
+    Args:
+    index (dict): A ranking index.
+    metric (str): The metric to rank by.
+    entities (iterable): The areas, e.g. ["Highland", "Orkney Islands"].
+    largest (bool): True if rank 1 is the largest value, False if it is the smallest.
+
+    Returns:
+    pd.Series: Rank per area (missing for areas without a value or not in the index).
+    """
+    m = index["metrics"].index(metric)
+    positions = index["entities"].get_indexer(list(entities))
+    found = positions >= 0
+
+    ranks = np.full(len(positions), np.nan)
+    ranks[found] = index["rank_largest" if largest else "rank_smallest"][m][positions[found]]
+    # Missing values are placed after the valid ones and have no rank
+    ranks[ranks > index["valid"][m]] = np.nan
+
+    return pd.Series(ranks, index=list(entities), name=f"{metric}_Rank").astype("Int64")
+
+
+def ranked_table(table: pd.DataFrame, index: dict, metric: str, largest: bool = True) -> pd.DataFrame:
+    """
+    Returns the rows of a table in rank order with a Rank column, without sorting it again.
+
+    Args:
+    table (pd.DataFrame): The table the index was built from.
+    index (dict): Its ranking index.
+    metric (str): The metric to rank by.
+    largest (bool): True for the largest value first.
+
+    Returns:
+    pd.DataFrame: The rows in rank order, with Rank (1, 2, ...) as the first column.
+    """
+    ranked = table.iloc[ranked_positions(index, metric, largest)].copy()
+    ranked.insert(0, "Rank", np.arange(1, len(ranked) + 1))
+    return ranked
+
+
+def build_level_rankings(cube: pd.DataFrame, year: int, metrics: list = CUBE_METRICS) -> dict:
+    """
+    Builds a ranking index for every geography level of the cube in one year.
+
+    Args:
+    cube (pd.DataFrame): A cube from geo_rollup.build_cube or load_cube.
+    year (int): The year to rank.
+    metrics (list): Cube columns to rank.
+
+    Returns:
+    dict: Level -> ranking index, with the areas named by the level's code.
+    """
+    rankings = {}
+    for level, codes in ROLLUP_LEVELS.items():
+        rows = query_cube(cube, level, years=[year])
+        rows = rows.set_index(rows[codes[-1]].astype(str))
+        rankings[level] = build_ranking_index(rows, [col for col in metrics if col in rows.columns])
+    return rankings
+
+
+def save_ranking_index(index: dict, path) -> Path:
+    """
+    Saves a ranking index.
+
+    Args:
+    index (dict): A ranking index.
+    path (str | Path): Target .npz file.
+
+    Returns:
+    Path: The written file.
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".part.npz")
+    arrays = {key: index[key] for key in ["order_largest", "order_smallest", "rank_largest", "rank_smallest", "valid"]}
+    np.savez(partial, entities=index["entities"].to_numpy(dtype=str), metrics=np.asarray(index["metrics"]), **arrays)
+    partial.replace(path)
+    return path
+
+
+def load_ranking_index(path) -> dict:
+    """
+    Loads a saved ranking index.
+
+    Args:
+    path (str | Path): The .npz file.
+
+    Returns:
+    dict: The ranking index (see build_ranking_index).
+    """
+    with np.load(path) as data:
+        index = {key: data[key] for key in data.files}
+    index["entities"] = pd.Index(index["entities"])
+    index["metrics"] = index["metrics"].tolist()
+    return index
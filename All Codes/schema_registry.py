@@ -0,0 +1,151 @@
+"""
+Schema registry for the yearly electricity files.
+
+The gov.uk files have used slightly different column names over the years, so
+scripts used to guess columns on every run (e.g. "the first column containing
+'cons'"). Here each year's header is resolved once against explicit rules,
+validated (every required column found exactly once) and the mapping is cached
+in a small sidecar file (electricity_scotland_{year}.schema.json). Loaders then
+ask for canonical column names and read exactly those columns with usecols.
+
+"""
+
+import json
+import os
+import re
+import pandas as pd
+from pathlib import Path
+
+# Canonical column -> rule on the normalised source name (lower case, letters only)
+COLUMN_RULES = {
+    "Outcode": lambda name: "outcode" in name,
+    "Postcode": lambda name: name in ("postcode", "pcd", "pcds") or ("post" in name and "code" in name and "out" not in name),
+    "Num_meters": lambda name: "meter" in name,
+    "Total_cons_kwh": lambda name: "total" in name and ("cons" in name or "kwh" in name),
+    "Mean_cons_kwh": lambda name: "mean" in name and ("cons" in name or "kwh" in name),
+    "Median_cons_kwh": lambda name: "median" in name and ("cons" in name or "kwh" in name),
+}
+
+# Columns every year must have
+REQUIRED_COLUMNS = ["Postcode", "Num_meters", "Total_cons_kwh"]
+
+
+def normalise_name(name: str) -> str:
+    """
+    Normalises a column name for matching: lower case with only letters kept.
+
+    Args:
+    name (str): A column name from a file header.
+
+    Returns:
+    str: e.g. "Total_cons_kwh " -> "totalconskwh".
+    """
+    return re.sub(r"[^a-z]", "", name.lower())
+
+
+def resolve_schema(header: list[str]) -> dict[str, str]:
+    """
+    Maps canonical column names to the column names of one file header.
+
+    Args:
+    header (list[str]): The column names of the file.
+
+    Returns:
+    dict[str, str]: Canonical name -> column name in the file (optional columns may be missing).
+
+    Raises:
+    ValueError: If a required column is missing or any canonical column matches more than one column.
+    """
+    mapping = {}
+    problems = []
+
+    for canonical, rule in COLUMN_RULES.items():
+        matches = [col for col in header if rule(normalise_name(col))]
+        if len(matches) > 1:
+            problems.append(f"{canonical} matches several columns {matches}")
+        elif matches:
+            mapping[canonical] = matches[0]
+        elif canonical in REQUIRED_COLUMNS:
+            problems.append(f"{canonical} not found")
+
+    if problems:
+        raise ValueError(f"Unrecognised column layout {header}: " + "; ".join(problems))
+
+    return mapping
+
+
+def schema_path(csv_path) -> Path:
+    """
+    Returns the sidecar file caching the schema of a CSV file.
+
+    Args:
+    csv_path (str | Path): Path to a yearly CSV file.
+
+    Returns:
+    Path: e.g. electricity_scotland_2019.schema.json.
+    """
+    return Path(csv_path).with_suffix(".schema.json")
+
+
+def get_schema(csv_path) -> dict[str, str]:
+    """
+    Returns the canonical -> source column mapping of a CSV file, resolving it only once.
+
+    The cached mapping is reused as long as the file's size and modification time
+    are unchanged; otherwise the header is read again and validated.
+
+    Args:
+    csv_path (str | Path): Path to a yearly CSV file.
+
+    Returns:
+    dict[str, str]: Canonical name -> column name in the file.
+    """
+    csv_path = Path(csv_path)
+    stat = csv_path.stat()
+    signature = [stat.st_size, stat.st_mtime_ns]
+
+    cache_file = schema_path(csv_path)
+    if cache_file.exists():
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return cached["columns"]
+
+    header = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    mapping = resolve_schema(header)
+
+    partial = cache_file.with_name(cache_file.name + ".part")
+    with open(partial, "w") as f:
+        json.dump({"signature": signature, "columns": mapping}, f, indent=2)
+    os.replace(partial, cache_file)
+
+    return mapping
+
+
+def read_with_schema(csv_path, columns: list | None = None, dtypes: dict | None = None) -> pd.DataFrame:
+    """
+    Reads the requested canonical columns of a CSV file, renamed to their canonical names.
+
+    Args:
+    csv_path (str | Path): Path to a yearly CSV file.
+    columns (list | None): Canonical columns to read, or None for every recognised column.
+    dtypes (dict | None): Canonical name -> dtype to parse the columns with.
+
+    Returns:
+    pd.DataFrame: The columns under their canonical names.
+
+    Raises:
+    KeyError: If a requested column does not exist in this file.
+    """
+    mapping = get_schema(csv_path)
+    columns = list(mapping) if columns is None else columns
+
+    missing = [c for c in columns if c not in mapping]
+    if missing:
+        raise KeyError(f"{Path(csv_path).name} has no column for {missing}")
+
+    usecols = [mapping[c] for c in columns]
+    dtype = {mapping[c]: t for c, t in (dtypes or {}).items() if c in columns}
+
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=dtype)
+    return df.rename(columns={source: canonical for canonical, source in mapping.items()})[columns]
@@ -0,0 +1,415 @@
+"""
+Prebuilt binary index of the Scottish Postcode Lookup (SSPL).
+
+The SSPL CSV is large and has dozens of columns, but the analyses only need a
+postcode's council, DataZones, Intermediate Zones and coordinates.
+build_sspl_index reads those columns once, packs the postcodes into integer
+keys (see postcodes.py), sorts them and saves every column as a plain .npy
+array next to the CSV (Scottish_Postcode_Lookup_2025_1.index/). Text columns
+are stored as small integer codes plus a list of their distinct values.
+
+load_sspl_index memory-maps the arrays, which takes milliseconds, and
+lookup_postcodes / lookup_keys join postcodes against it with a binary search
+on the integer keys instead of re-reading the CSV and merging on strings.
+
+The index can be built from the CSV or straight from the downloaded SSPL zip
+(acquire_sspl_index): the CSV member is streamed while it is decompressed and
+only the indexed columns are parsed, a chunk at a time, so the full CSV never
+has to be extracted or parsed again.
+
+"""
+
+import json
+import os
+import shutil
+import zipfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from download_cache import cached_path, fetch
+from postcodes import MISSING_KEY, decode_postcodes, encode_postcodes
+
+# SSPL column -> name used in the index
+SSPL_INDEX_COLUMNS = {
+    "CouncilArea2019Code": "Council_Code",
+    "DataZone2011Code": "DataZone2011",
+    "DataZone2022Code": "DataZone2022",
+    "IntermediateZone2011Code": "IntermediateZone2011",
+    "IntermediateZone2022Code": "IntermediateZone2022",
+    "Latitude": "Latitude",
+    "Longitude": "Longitude",
+}
+
+# Index columns holding coordinates (stored as float32, the rest are coded text)
+COORDINATE_COLUMNS = ["Latitude", "Longitude"]
+
+# SSPL rows parsed at a time while building the index
+SSPL_CHUNK_ROWS = 100_000
+
+# Bump when the layout of the index files changes
+INDEX_VERSION = 3
+
+
+def index_dir_for(sspl_csv) -> Path:
+    """
+    Returns the folder holding the index of an SSPL CSV file.
+
+    Args:
+    sspl_csv (str | Path): Path to the SSPL CSV.
+
+    Returns:
+    Path: e.g. Scottish_Postcode_Lookup_2025_1.index next to the CSV.
+    """
+    sspl_csv = Path(sspl_csv)
+    return sspl_csv.with_name(sspl_csv.stem + ".index")
+
+
+def source_signature(sspl_csv) -> list:
+    """
+    Identifies a version of the SSPL CSV by its size and modification time.
+
+    Args:
+    sspl_csv (str | Path): Path to the SSPL CSV.
+
+    Returns:
+    list: [size, mtime in ns].
+    """
+    stat = Path(sspl_csv).stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def write_index(frame: pd.DataFrame, index_dir, signature=None) -> Path:
+    """
+    Writes postcode attributes as a sorted, memory-mappable index.
+
+    Args:
+    frame (pd.DataFrame): A Postcode column (any format) or Postcode_Key column plus the index columns.
+    index_dir (str | Path): Folder to write the index to (replaced if it exists).
+    signature (list | None): Signature of the source file, stored for staleness checks.
+
+    Returns:
+    Path: The index folder.
+    """
+    index_dir = Path(index_dir)
+    staging = index_dir.with_name(index_dir.name + ".part")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    if "Postcode_Key" not in frame.columns:
+        frame.insert(0, "Postcode_Key", encode_postcodes(frame.pop("Postcode")))
+    frame = frame[frame["Postcode_Key"] != MISSING_KEY]
+    frame = frame.drop_duplicates("Postcode_Key").sort_values("Postcode_Key", ignore_index=True)
+
+    np.save(staging / "Postcode_Key.npy", frame["Postcode_Key"].to_numpy(dtype="int64"))
+
+    categories = {}
+    for col in frame.columns.drop("Postcode_Key"):
+        if col in COORDINATE_COLUMNS:
+            np.save(staging / f"{col}.npy", pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype="float32"))
+        else:
+            values = frame[col].astype("category")
+            categories[col] = values.cat.categories.astype(str).tolist()
+            np.save(staging / f"{col}.npy", values.cat.codes.to_numpy(dtype="int32"))
+
+    with open(staging / "meta.json", "w") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "signature": signature,
+            "rows": len(frame),
+            "columns": frame.columns.drop("Postcode_Key").tolist(),
+            "categories": categories,
+        }, f)
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(staging, index_dir)
+    return index_dir
+
+
+def is_index_column(name: str) -> bool:
+    """
+    Tells whether an SSPL column is kept in the index (used as usecols while reading).
+
+    Args:
+    name (str): A column name of the SSPL CSV.
+
+    Returns:
+    bool: True for the postcode column and the columns of SSPL_INDEX_COLUMNS.
+    """
+    return name.strip().lstrip("\ufeff").lower() == "postcode" or name in SSPL_INDEX_COLUMNS
+
+
+def read_index_columns(stream, chunk_rows: int = SSPL_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Reads the indexed columns of an SSPL CSV stream in chunks.
+
+    Only the indexed columns are parsed, and every chunk is shrunk straight away
+    (postcodes to integer keys, codes to categories, coordinates to float32), so
+    memory holds the compact index columns plus one small chunk of text.
+
+    Args:
+    stream (file-like | str | Path): The CSV, e.g. an open member of the SSPL zip.
+    chunk_rows (int): Rows parsed at a time.
+
+    Returns:
+    pd.DataFrame: Postcode_Key plus the index columns.
+    """
+    chunks = []
+    for chunk in pd.read_csv(stream, usecols=is_index_column, dtype=str, chunksize=chunk_rows):
+        postcode_col = next(c for c in chunk.columns if c not in SSPL_INDEX_COLUMNS)
+        chunk = chunk.rename(columns={postcode_col: "Postcode", **SSPL_INDEX_COLUMNS})
+        chunk.insert(0, "Postcode_Key", encode_postcodes(chunk.pop("Postcode")))
+
+        for col in chunk.columns.drop("Postcode_Key"):
+            if col in COORDINATE_COLUMNS:
+                chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float32")
+            else:
+                chunk[col] = chunk[col].astype("category")
+        chunks.append(chunk)
+
+    # Categories differ between chunks, so combine them with union_categoricals
+    frame = pd.DataFrame({"Postcode_Key": np.concatenate([c["Postcode_Key"].to_numpy() for c in chunks])})
+    for col in chunks[0].columns.drop("Postcode_Key"):
+        if col in COORDINATE_COLUMNS:
+            frame[col] = np.concatenate([c[col].to_numpy() for c in chunks])
+        else:
+            frame[col] = pd.api.types.union_categoricals([c[col] for c in chunks])
+
+    return frame
+
+
+def sspl_member(zip_ref: zipfile.ZipFile) -> str:
+    """
+    Finds the SSPL CSV inside the downloaded zip.
+
+    Args:
+    zip_ref (zipfile.ZipFile): The opened SSPL zip.
+
+    Returns:
+    str: Name of the CSV member.
+    """
+    return next(f for f in zip_ref.namelist() if f.lower().endswith(".csv") and "__MACOSX" not in f)
+
+
+def extract_sspl_csv(zip_path, target) -> Path:
+    """
+    Extracts the SSPL CSV from the downloaded zip, for code that reads the CSV itself (e.g. the report notebook).
+
+    Args:
+    zip_path (str | Path): The SSPL zip, e.g. from download_cache.fetch.
+    target (str | Path): Where to write the CSV, e.g. Scottish_Postcode_Lookup_2025_1.csv.
+
+    Returns:
+    Path: The extracted CSV.
+    """
+    target = Path(target)
+    partial = target.with_name(target.name + ".part")
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        with zip_ref.open(sspl_member(zip_ref)) as stream, open(partial, "wb") as f:
+            shutil.copyfileobj(stream, f)
+    partial.replace(target)
+    return target
+
+
+def build_sspl_index(source, index_dir=None) -> Path:
+    """
+    Builds the binary index from the SSPL CSV or straight from the SSPL zip, reading only the indexed columns.
+
+    A zip is read by streaming its CSV member while it is decompressed, so the
+    CSV is never extracted to disk.
+
+    Args:
+    source (str | Path): Path to the SSPL CSV or to the downloaded zip.
+    index_dir (str | Path | None): Where to write the index (default: next to the source).
+
+    Returns:
+    Path: The index folder.
+    """
+    index_dir = index_dir or index_dir_for(source)
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zip_ref:
+            with zip_ref.open(sspl_member(zip_ref)) as stream:
+                frame = read_index_columns(stream)
+    else:
+        frame = read_index_columns(source)
+
+    return write_index(frame, index_dir, source_signature(source))
+
+
+def index_is_current(index_dir, source=None) -> bool:
+    """
+    Tells whether an index exists in the current layout and matches its source file.
+
+    Args:
+    index_dir (str | Path): The index folder.
+    source (str | Path | None): The SSPL CSV or zip it was built from; if None or
+                                missing, any index in the current layout counts as current.
+
+    Returns:
+    bool: True if the index can be used as it is.
+    """
+    meta_file = Path(index_dir) / "meta.json"
+    if not meta_file.exists():
+        return False
+
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get("version") != INDEX_VERSION:
+        return False
+
+    return source is None or not Path(source).exists() or meta.get("signature") == source_signature(source)
+
+
+def ensure_sspl_index(source, index_dir=None) -> dict:
+    """
+    Loads the index of an SSPL CSV (or zip), (re)building it first if it is missing or stale.
+
+    If the source file is gone (e.g. the index was built from a zip that was never
+    extracted), an existing index is used as it is.
+
+    Args:
+    source (str | Path): Path to the SSPL CSV or zip.
+    index_dir (str | Path | None): Index folder (default: next to the source).
+
+    Returns:
+    dict: The loaded index (see load_sspl_index).
+    """
+    index_dir = Path(index_dir or index_dir_for(source))
+    if index_is_current(index_dir, source):
+        return load_sspl_index(index_dir)
+
+    print(f"Building SSPL index: {index_dir.name}")
+    build_sspl_index(source, index_dir)
+    return load_sspl_index(index_dir)
+
+
+def acquire_sspl_index(url: str, cache_dir, index_dir) -> dict:
+    """
+    Downloads the SSPL zip (through the download cache) and streams it into the index.
+
+    An existing index is used as it is if the zip is no longer in the cache.
+
+    Args:
+    url (str): URL of the SSPL zip.
+    cache_dir (str | Path): Download cache folder (see download_cache.py).
+    index_dir (str | Path): Index folder, e.g. index_dir_for(<where the CSV would be>).
+
+    Returns:
+    dict: The loaded index (see load_sspl_index).
+    """
+    if not cached_path(url, cache_dir) and index_is_current(index_dir):
+        return load_sspl_index(index_dir)
+
+    zip_path = fetch(url, cache_dir)
+    return ensure_sspl_index(zip_path, index_dir)
+
+
+def load_sspl_index(index_dir) -> dict:
+    """
+    Memory-maps a prebuilt SSPL index.
+
+    Args:
+    index_dir (str | Path): The index folder.
+
+    Returns:
+    dict: "Postcode_Key" (sorted postcode keys), one array per index column,
+          and "categories" (column -> list of distinct values for coded columns).
+    """
+    index_dir = Path(index_dir)
+    with open(index_dir / "meta.json") as f:
+        meta = json.load(f)
+
+    index = {"categories": meta["categories"], "columns": meta["columns"]}
+    for col in ["Postcode_Key"] + meta["columns"]:
+        index[col] = np.load(index_dir / f"{col}.npy", mmap_mode="r")
+
+    return index
+
+
+def index_column(index: dict, col: str, positions: np.ndarray | None = None, found: np.ndarray | None = None):
+    """
+    Returns an index column (optionally at given positions) as a pandas-ready array.
+
+    Args:
+    index (dict): A loaded index.
+    col (str): The index column.
+    positions (np.ndarray | None): Row positions to take, or None for every row.
+    found (np.ndarray | None): Which positions are real matches; the others become missing.
+
+    Returns:
+    pd.Categorical | np.ndarray: Categorical values for coded columns, floats for coordinates.
+    """
+    values = np.asarray(index[col]) if positions is None else np.asarray(index[col])[positions]
+
+    if col in index["categories"]:
+        if found is not None:
+            values = np.where(found, values, -1)
+        return pd.Categorical.from_codes(values, categories=index["categories"][col])
+
+    values = values.astype("float64")
+    if found is not None:
+        values[~found] = np.nan
+    return values
+
+
+def sspl_frame(index: dict, columns: list | None = None, with_space: bool = False) -> pd.DataFrame:
+    """
+    Returns the index as a dataframe with Postcode_Key and normalised Postcode columns.
+
+    Args:
+    index (dict): A loaded index.
+    columns (list | None): Index columns to include, or None for all of them.
+    with_space (bool): Write postcodes as in the SSPL ("EH1 1AA") instead of normalised ("EH11AA").
+
+    Returns:
+    pd.DataFrame: One row per postcode.
+    """
+    columns = index["columns"] if columns is None else columns
+    keys = np.asarray(index["Postcode_Key"])
+    frame = pd.DataFrame({"Postcode_Key": keys, "Postcode": decode_postcodes(keys, with_space)})
+    for col in columns:
+        frame[col] = index_column(index, col)
+    return frame
+
+
+def lookup_keys(index: dict, keys: np.ndarray, columns: list | None = None) -> dict:
+    """
+    Looks up index columns for integer postcode keys with a binary search.
+
+    Args:
+    index (dict): A loaded index.
+    keys (np.ndarray): Keys made by postcodes.encode_postcodes.
+    columns (list | None): Index columns to return, or None for all of them.
+
+    Returns:
+    dict: Column -> values aligned with keys (missing where a postcode is not in the SSPL).
+    """
+    columns = index["columns"] if columns is None else columns
+    keys = np.asarray(keys, dtype="int64")
+
+    sorted_keys = index["Postcode_Key"]
+    if len(sorted_keys) == 0:
+        # An index built from a source without matching rows finds nothing
+        return {col: pd.Categorical.from_codes(np.full(len(keys), -1), categories=index["categories"][col])
+                if col in index["categories"] else np.full(len(keys), np.nan) for col in columns}
+    positions = np.searchsorted(sorted_keys, keys)
+    positions = np.minimum(positions, len(sorted_keys) - 1)
+    found = (np.asarray(sorted_keys)[positions] == keys) & (keys != MISSING_KEY)
+
+    return {col: index_column(index, col, positions, found) for col in columns}
+
+
+def lookup_postcodes(index: dict, postcodes: pd.Series, columns: list | None = None) -> pd.DataFrame:
+    """
+    Looks up index columns for a series of postcodes (a left join on the postcode).
+
+    Args:
+    index (dict): A loaded index.
+    postcodes (pd.Series): Postcodes in any format.
+    columns (list | None): Index columns to return, or None for all of them.
+
+    Returns:
+    pd.DataFrame: The requested columns aligned with the input (missing where a postcode is not in the SSPL).
+    """
+    return pd.DataFrame(lookup_keys(index, encode_postcodes(postcodes), columns), index=postcodes.index)
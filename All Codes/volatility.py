@@ -0,0 +1,203 @@
+"""
+Year-to-year volatility of consumption per postcode or DataZone.
+
+Variance, coefficient of variation and maximum drawdown across the years are
+computed in one pass over the panel's year partitions (see
+electricity_store.py), so only one year of postcode rows and a small
+accumulator per postcode or DataZone are in memory at a time, never the full
+postcode x year matrix.
+
+The accumulator of an area holds its number of years, running mean and sum of
+squared deviations (M2, Welford / Chan et al.), its highest and lowest value
+and its largest drawdown so far. Accumulators of two time spans are merged
+with merge_accumulators, and a new year is just a one-year accumulator merged
+onto the end, so spans can also be accumulated separately (e.g. in parallel)
+and merged afterwards. Drawdowns depend on the order of the years, so the
+earlier span must be passed first.
+
+The value of a postcode in a year is its kWh per meter (Total_cons_kwh /
+Num_meters); for a DataZone it is the DataZone's total kWh / meters.
+
+Run this file to compute the volatility of every DataZone and postcode.
+
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from electricity_store import panel_partition, panel_years, read_partition
+from geo_rollup import ZONE_VINTAGE, attach_geography
+from postcodes import MISSING_KEY, decode_postcodes
+
+# Columns of an accumulator (one row per postcode or DataZone)
+ACCUMULATOR_COLUMNS = ["Years", "Mean", "M2", "Peak", "Trough", "Max_Drawdown"]
+
+# Levels the volatility can be computed at, and the key naming an area on each
+VOLATILITY_LEVELS = {"Postcode": "Postcode_Key", "DataZone": "DataZone"}
+
+# Default locations when run as a script
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CLEAN_DATA_DIR = PROJECT_ROOT / "cleaning data with code" / "clean_data"
+SSPL_FILE = PROJECT_ROOT / "council area with elec consumption" / "Scottish_Postcode_Lookup_2025_1.csv"
+
+
+def year_accumulator(values: pd.Series) -> pd.DataFrame:
+    """
+    Starts an accumulator from the values of one year.
+
+    Args:
+    values (pd.Series): One value per area (missing values are left out).
+
+    Returns:
+    pd.DataFrame: The accumulator, indexed like the values.
+    """
+    values = values.dropna().astype("float64")
+    return pd.DataFrame({
+        "Years": 1,
+        "Mean": values,
+        "M2": 0.0,
+        "Peak": values,
+        "Trough": values,
+        "Max_Drawdown": 0.0,
+    }, index=values.index)
+
+
+def merge_accumulators(earlier: pd.DataFrame, later: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merges the accumulators of two consecutive time spans.
+
+    Args:
+    earlier (pd.DataFrame): Accumulator of the earlier years.
+    later (pd.DataFrame): Accumulator of the later years.
+
+    Returns:
+    pd.DataFrame: The accumulator of both spans, for every area in either of them.
+    """
+    areas = earlier.index.union(later.index)
+    a = earlier.reindex(areas)
+    b = later.reindex(areas)
+    na = a["Years"].fillna(0).to_numpy()
+    nb = b["Years"].fillna(0).to_numpy()
+    n = na + nb
+
+    # Areas missing from one span keep the other span's values
+    only_a, only_b = nb == 0, na == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = b["Mean"].to_numpy() - a["Mean"].to_numpy()
+        mean = a["Mean"].to_numpy() + delta * nb / n
+        m2 = a["M2"].to_numpy() + b["M2"].to_numpy() + delta ** 2 * na * nb / n
+        # A drop from a peak of the earlier span to a trough of the later one
+        crossing = (a["Peak"].to_numpy() - b["Trough"].to_numpy()) / a["Peak"].to_numpy()
+
+    drawdown = np.fmax(np.fmax(a["Max_Drawdown"].to_numpy(), b["Max_Drawdown"].to_numpy()), crossing)
+    merged = pd.DataFrame({
+        "Years": n.astype("int64"),
+        "Mean": np.where(only_a, a["Mean"], np.where(only_b, b["Mean"], mean)),
+        "M2": np.where(only_a, a["M2"], np.where(only_b, b["M2"], m2)),
+        "Peak": np.fmax(a["Peak"], b["Peak"]),
+        "Trough": np.fmin(a["Trough"], b["Trough"]),
+        "Max_Drawdown": np.where(only_a, a["Max_Drawdown"], np.where(only_b, b["Max_Drawdown"], drawdown)),
+    }, index=areas)
+    return merged[ACCUMULATOR_COLUMNS]
+
+
+def volatility_stats(accumulator: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns an accumulator into volatility statistics.
+
+    Args:
+    accumulator (pd.DataFrame): An accumulator from year_accumulator / merge_accumulators.
+
+    Returns:
+    pd.DataFrame: Years, Mean, Variance (across years, ddof=1 as pandas' var), Std,
+                  CV (Std / Mean) and Max_Drawdown_Pct (largest drop from an earlier peak, in %).
+    """
+    years = accumulator["Years"]
+    variance = accumulator["M2"] / (years - 1).where(years > 1)
+    std = np.sqrt(variance)
+
+    return pd.DataFrame({
+        "Years": years,
+        "Mean": accumulator["Mean"],
+        "Variance": variance,
+        "Std": std,
+        "CV": std / accumulator["Mean"].where(accumulator["Mean"] != 0),
+        "Max_Drawdown_Pct": accumulator["Max_Drawdown"] * 100,
+    })
+
+
+def year_values(rows: pd.DataFrame, level: str, index: dict | None = None, vintage: str = ZONE_VINTAGE) -> pd.Series:
+    """
+    Computes the kWh per meter of every postcode or DataZone in one year.
+
+    Args:
+    rows (pd.DataFrame): One year of postcode rows with Postcode_Key, Num_meters and Total_cons_kwh.
+    level (str): "Postcode" or "DataZone".
+    index (dict | None): A loaded SSPL index (needed for DataZones).
+    vintage (str): DataZone boundaries, "2011" or "2022".
+
+    Returns:
+    pd.Series: kWh per meter, indexed by Postcode_Key or DataZone code.
+    """
+    if level == "DataZone":
+        rows = attach_geography(rows, index, vintage)
+    else:
+        # Postcodes that could not be encoded share MISSING_KEY and are not one postcode
+        rows = rows[rows["Postcode_Key"] != MISSING_KEY]
+    sums = rows.groupby(VOLATILITY_LEVELS[level], observed=True)[["Total_cons_kwh", "Num_meters"]].sum()
+
+    meters = sums["Num_meters"].astype("float64")
+    return sums["Total_cons_kwh"].astype("float64") / meters.where(meters > 0)
+
+
+def stream_volatility(panel_dir, level: str = "DataZone", index: dict | None = None, years=None,
+                      vintage: str = ZONE_VINTAGE) -> pd.DataFrame:
+    """
+    Computes the volatility of every postcode or DataZone in one pass over the panel's year partitions.
+
+    Args:
+    panel_dir (str | Path): The panel folder, e.g. clean_data/consumption_panel.
+    level (str): "Postcode" or "DataZone".
+    index (dict | None): A loaded SSPL index (needed for DataZones).
+    years (iterable | None): Years to include, or None for every stored year.
+    vintage (str): DataZone boundaries, "2011" or "2022".
+
+    Returns:
+    pd.DataFrame: The statistics of volatility_stats per area (with a Postcode column at postcode level).
+    """
+    if level not in VOLATILITY_LEVELS:
+        raise ValueError(f"Unknown level {level!r}, expected one of {list(VOLATILITY_LEVELS)}")
+
+    stored = panel_years(panel_dir)
+    if years is not None:
+        wanted = set(years)
+        stored = [year for year in stored if year in wanted]
+
+    accumulator = year_accumulator(pd.Series(dtype="float64"))
+    for year in stored:
+        rows = read_partition(panel_partition(panel_dir, year), ["Postcode_Key", "Num_meters", "Total_cons_kwh"])
+        accumulator = merge_accumulators(accumulator, year_accumulator(year_values(rows, level, index, vintage)))
+
+    stats = volatility_stats(accumulator)
+    stats.index.name = VOLATILITY_LEVELS[level]
+    if level == "Postcode":
+        stats.insert(0, "Postcode", decode_postcodes(stats.index.to_numpy(), with_space=True))
+    return stats
+
+
+if __name__ == "__main__":
+    from sspl_index import ensure_sspl_index
+
+    panel_dir = CLEAN_DATA_DIR / "consumption_panel"
+    if not panel_years(panel_dir) or not SSPL_FILE.exists():
+        print("Panel or SSPL file not found. Please run the cleaning and council scripts first.")
+        sys.exit(1)
+
+    sspl_index = ensure_sspl_index(SSPL_FILE)
+    for level in VOLATILITY_LEVELS:
+        stats = stream_volatility(panel_dir, level, sspl_index)
+        path = CLEAN_DATA_DIR / f"{level}_Volatility.csv"
+        stats.to_csv(path)
+        print(f"Saved volatility of {len(stats)} {level}s to: {path}")
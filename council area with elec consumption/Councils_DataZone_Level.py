@@ -1,6 +1,13 @@
-import pandas as pd
+import sys
 from pathlib import Path
 
+# The typed store reader, SSPL index, rollup cube and data resolver live with the cleaning code in "All Codes"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "All Codes"))
+from data_resolver import find_data, not_found_message
+from electricity_store import load_years, memory_footprint
+from geo_rollup import build_cube, query_cube, read_council_partitions, write_council_partitions
+from sspl_index import ensure_sspl_index, load_sspl_index
+
 #CONFIGURATION
 TARGET_COUNCILS = [
     "Glasgow City", 
@@ -12,6 +19,12 @@ TARGET_COUNCILS = [
 
 OUTPUT_FILE = "Selected_5_Councils_DataZone_Level.csv"
 
+# DataZone results of all 32 councils, in Council_Code={code}/Year={year} folders
+PARTITION_DIR_NAME = "DataZone_Level_By_Council"
+
+# Columns of the cleaned data this extraction needs
+ELEC_COLUMNS = ["Postcode_Key", "Num_meters", "Total_cons_kwh"]
+
 
 # Mapping GSS Council Codes to readable names
 COUNCIL_MAPPING = {
@@ -28,134 +41,96 @@ COUNCIL_MAPPING = {
     "S12000039": "West Dunbartonshire", "S12000040": "West Lothian"
 }
 
-#HELPER FUNCTION
-def find_file(filename):
-    """
-    Search for files in standard project directories.
-    """
-    script_dir = Path(__file__).resolve().parent
-    project_root = script_dir.parent
-    
-    # Define potential paths including specific data directories
-    specific_path = project_root / "cleaning data with code" / "clean_data" / filename
-    
-    possible_paths = [
-        specific_path,
-        script_dir / filename,
-        script_dir / "clean_data" / filename,
-        Path.cwd() / "clean_data" / filename,
-        project_root / "clean_data" / filename,
-    ]
-    
-    # Check specific paths first
-    for path in possible_paths:
-        if path.exists(): return path
-            
-    # Recursive search as fallback
-    try:
-        results = list(project_root.rglob(filename))
-        if results: return results[0]
-    except:
-        pass
-
-    return None
+# The cleaned data folder is searched before the rest of the project
+SCRIPT_DIR = Path(__file__).resolve().parent
+DATA_DIRS = [SCRIPT_DIR.parent / "cleaning data with code" / "clean_data", SCRIPT_DIR, SCRIPT_DIR / "clean_data"]
 
 def process_datazone_aggregation():
     print("Starting Data Zone Level Extraction")
     
     #Load Scottish Postcode Lookup (SSPL)
-    sspl_file = find_file("Scottish_Postcode_Lookup_2025_1.csv")
+    sspl_file = find_data("Scottish_Postcode_Lookup_2025_1.csv", prefer=DATA_DIRS)
+    # analyze_council_changes.py may have built the index straight from the SSPL zip, without a CSV
+    sspl_file = sspl_file or find_data("Scottish_Postcode_Lookup_2025_1.index", is_dir=True, prefer=DATA_DIRS)
     if not sspl_file:
-        print("CRITICAL: SSPL file not found.")
+        print(f"CRITICAL: SSPL file not found. {not_found_message('Scottish_Postcode_Lookup_2025_1.csv', prefer=DATA_DIRS)}")
         return
 
     print(f"Loading SSPL: {sspl_file.name}")
     try:
-        # Determine column names dynamically or use defaults
-        header = pd.read_csv(sspl_file, nrows=0).columns.tolist()
-        pc_col = next((c for c in header if "postcode" in c.lower().replace(" ", "")), "Postcode")
-        council_code_col = "CouncilArea2019Code"
-        dz_code_col = "DataZone2022Code"
-        
-        # Read only necessary columns
-        sspl = pd.read_csv(sspl_file, usecols=[pc_col, council_code_col, dz_code_col], low_memory=False)
-        sspl = sspl.rename(columns={pc_col: 'Postcode', council_code_col: 'Council_Code', dz_code_col: 'DataZone'})
-        
-        # Map Council Codes to Names for filtering
-        sspl['Council_Area'] = sspl['Council_Code'].map(COUNCIL_MAPPING)
-        sspl['Postcode'] = sspl['Postcode'].astype(str).str.replace(" ", "").str.upper()
+        # Memory-mapped postcode index, built from the SSPL CSV on the first run only
+        if sspl_file.is_dir():
+            sspl_index = load_sspl_index(sspl_file)
+        else:
+            sspl_index = ensure_sspl_index(sspl_file)
     except Exception as e:
         print(f"SSPL Error: {e}")
         return
 
-    #Filter SSPL for Target Councils
-    sspl_filtered = sspl[sspl['Council_Area'].isin(TARGET_COUNCILS)].copy()
-    print(f"Filtered SSPL: {len(sspl_filtered)} rows for target councils.")
+    #Council codes of the Target Councils
+    target_codes = [code for code, name in COUNCIL_MAPPING.items() if name in TARGET_COUNCILS]
+    print(f"SSPL index: {len(sspl_index['Postcode_Key'])} postcodes, {len(COUNCIL_MAPPING)} councils.")
     
-    all_years_data = []
-
-    #Process Yearly Electricity Data (2015-2023)
+    #Locate Yearly Electricity Data (2015-2023)
+    csv_paths = {}
     for year in range(2015, 2024):
         elec_filename = f"electricity_scotland_{year}.csv"
-        elec_path = find_file(elec_filename)
+        elec_path = find_data(elec_filename, prefer=DATA_DIRS)
         
         if not elec_path:
             print(f"[{year}] File not found: {elec_filename}")
             continue
             
-        print(f"[{year}] Processing: {elec_path.name}")
+        print(f"[{year}] Found: {elec_path.name}")
+        csv_paths[year] = elec_path
+
+    try:
+        # All years in long format, from the panel where it is up to date, loading only the needed columns.
+        # The schema registry maps them to the canonical names, so no column guessing is needed.
+        df_elec = load_years(csv_paths, columns=ELEC_COLUMNS)
+        memory_footprint(df_elec, "Electricity data (all years)")
+        total_col, meters_col = 'Total_cons_kwh', 'Num_meters'
         
-        try:
-            df_elec = pd.read_csv(elec_path)
-            # Clean column headers
-            df_elec.columns = [c.strip() for c in df_elec.columns]
-            
-            # Dynamic Column Identification
-            # 1. Postcode
-            pc_col_elec = next((c for c in df_elec.columns if 'post' in c.lower()), None)
-            
-            # 2. Total Consumption (contains 'cons' or 'kwh', exclude mean/median)
-            total_col = next((c for c in df_elec.columns if ('cons' in c.lower() or 'kwh' in c.lower()) and 'mean' not in c.lower() and 'median' not in c.lower()), None)
-            
-            # 3. Number of Meters
-            meters_col = next((c for c in df_elec.columns if 'meter' in c.lower() or 'num' in c.lower()), None)
-            
-            if not (pc_col_elec and total_col and meters_col):
-                print(f"  [SKIP] Could not identify required columns in {year}.")
-                continue
-                
-            # Data Cleaning
-            df_elec['Postcode'] = df_elec[pc_col_elec].astype(str).str.replace(" ", "").str.upper()
-            df_elec[total_col] = pd.to_numeric(df_elec[total_col], errors='coerce').fillna(0)
-            df_elec[meters_col] = pd.to_numeric(df_elec[meters_col], errors='coerce').fillna(0)
-            
-            # Merge Electricity Data with SSPL (DataZone info)
-            merged = pd.merge(df_elec, sspl_filtered, on='Postcode', how='inner')
-            
-            if merged.empty:
-                print(f"  [WARN] Merged 0 rows.")
-                continue
-            
-            # Aggregate from Postcode level to DataZone level
-            dz_stats = merged.groupby(['Council_Area', 'DataZone'])[[total_col, meters_col]].sum().reset_index()
-            
-            # Calculate Mean Consumption per DataZone
-            dz_stats['Mean_Consumption_kWh'] = dz_stats[total_col] / dz_stats[meters_col]
-            dz_stats['Year'] = year
-            
-            print(f"  -> Extracted data for {len(dz_stats)} DataZones.")
-            all_years_data.append(dz_stats)
-            
-        except Exception as e:
-            print(f"  [ERROR] {e}")
-            continue
+        # Sum kWh and meters per DataZone once for all councils and roll them up (see geo_rollup.py)
+        cube = build_cube(df_elec, sspl_index)
+        all_df = query_cube(cube, "DataZone")
+        all_df['Council_Area'] = all_df['Council_Code'].map(COUNCIL_MAPPING)
+        
+        # Calculate Mean Consumption per DataZone
+        all_df['Mean_Consumption_kWh'] = all_df[total_col] / all_df[meters_col]
+        all_df = all_df[['Council_Code', 'Council_Area', 'DataZone', total_col, meters_col, 'Mean_Consumption_kWh', 'Year']]
+        
+        for year, count in all_df.groupby('Year').size().items():
+            print(f"[{year}] Extracted data for {count} DataZones.")
+        
+    except Exception as e:
+        print(f"  [ERROR] {e}")
+        return
+
+    if all_df.empty:
+        print("\nNo data collected.")
+        return
+
+    #Save All Councils, one folder per council and year
+    partition_dir = write_council_partitions(all_df, SCRIPT_DIR / PARTITION_DIR_NAME)
+    print(f"\nSaved {len(all_df)} rows for {all_df['Council_Code'].nunique()} councils to: {partition_dir}")
+
+    try:
+        # The Target Councils only need their own partitions
+        final_df = read_council_partitions(partition_dir, target_codes)
+        final_df = final_df[['Council_Area', 'DataZone', total_col, meters_col, 'Mean_Consumption_kWh', 'Year']]
+        
+    except Exception as e:
+        print(f"  [ERROR] {e}")
+        return
 
     #Save Final Dataset
-    if not all_years_data:
+    if final_df.empty:
         print("\nNo data collected.")
         return
         
-    final_df = pd.concat(all_years_data, ignore_index=True)
+    # Sort names alphabetically rather than in categorical order
+    final_df[['Council_Area', 'DataZone']] = final_df[['Council_Area', 'DataZone']].astype(str)
     final_df = final_df.sort_values(by=['Council_Area', 'DataZone', 'Year'])
     
     final_df.to_csv(OUTPUT_FILE, index=False)
@@ -1,6 +1,12 @@
+import sys
 import pandas as pd
 from pathlib import Path
 
+# The change metric engine and ranking index live with the cleaning code in "All Codes"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "All Codes"))
+from change_metrics import load_change_metrics
+from ranking_index import build_ranking_index, ranked_table
+
 # Configuration for file names
 INPUT_FILE = "Scotland_Council_Change_Analysis.csv"
 
@@ -14,30 +20,26 @@ def generate_dual_rankings():
         print(f"Error: Could not find file {INPUT_FILE}. Please run the previous analysis script first.")
         return
 
-    df = pd.read_csv(INPUT_FILE, index_col=0)
-    
-    # Calculate Key Metrics
+    # Key Metrics, precomputed once for every event window (see change_metrics.py)
     #Covid Impact (2019 -> 2020): We focus on "Percentage Increase"
     # Logic: Lockdowns forced people to stay home, increasing domestic electricity use.
     # A higher positive percentage indicates a stronger impact from the lockdown.
-    df['Covid_Impact_Pct'] = ((df['2020'] - df['2019']) / df['2019']) * 100
-
     #Energy Crisis Impact (2021 -> 2022): We focus on "Percentage Decrease"
     # Logic: Skyrocketing prices forced households to reduce consumption.
     # A more negative percentage (larger drop) indicates a stronger impact from the price crisis.
-    df['Crisis_Impact_Pct'] = ((df['2022'] - df['2021']) / df['2021']) * 100
+    df = load_change_metrics(INPUT_FILE)
 
     #Generate Two Independent Ranking Tables
+    # Both impacts are sorted once in the ranking index; each table is a lookup with a Rank column
+    rankings = build_ranking_index(df, ['Covid_Impact_Pct', 'Crisis_Impact_Pct'])
     
     #Ranking 1: Pandemic Lockdown Impact
-    # Sort by highest increase first
-    covid_rank = df[['2019', '2020', 'Covid_Impact_Pct']].sort_values(by='Covid_Impact_Pct', ascending=False)
-    covid_rank.insert(0, 'Rank', range(1, len(covid_rank) + 1)) # Add a Rank column
+    # Highest increase first
+    covid_rank = ranked_table(df[['2019', '2020', 'Covid_Impact_Pct']], rankings, 'Covid_Impact_Pct', largest=True)
 
     #Ranking 2: Energy Crisis Impact
-    # Sort by largest decrease (most negative value) first
-    crisis_rank = df[['2021', '2022', 'Crisis_Impact_Pct']].sort_values(by='Crisis_Impact_Pct', ascending=True)
-    crisis_rank.insert(0, 'Rank', range(1, len(crisis_rank) + 1)) # Add a Rank column
+    # Largest decrease (most negative value) first
+    crisis_rank = ranked_table(df[['2021', '2022', 'Crisis_Impact_Pct']], rankings, 'Crisis_Impact_Pct', largest=False)
 
     # 4. Print Results to Terminal
     
@@ -4,18 +4,15 @@ across Scottish Council Areas from 2015 to 2023.
 
 It handles the entire pipeline:
 1.  Locating input data (cleaned CSVs) and reference data (SSPL) intelligently.
-2.  Downloading missing reference files (SSPL) automatically.
+2.  Downloading missing reference files (SSPL) automatically, through a resumable download cache,
+    extracting the CSV and building the postcode index from it.
 3.  Merging electricity meter data with administrative boundaries.
 4.  Calculating absolute and percentage changes in consumption.
 5.  Generating a ranked report csv file.
 
 """
 
-import io
 import sys
-import zipfile
-import requests
-import pandas as pd
 from pathlib import Path
 
 #CONFIGURATION AND CONSTANTS
@@ -32,84 +29,31 @@ SSPL_URL = "https://www.nrscotland.gov.uk/media/3zjlgpt3/sspl_2025_1.zip"
 # [MODIFIED]: Output file path is now strictly forced to be in the SCRIPT_DIR
 OUTPUT_FILE = SCRIPT_DIR / "Scotland_Council_Change_Analysis.csv"
 
-# Define a list of paths to search for data
-SEARCH_PATHS = [
-    SCRIPT_DIR,                 
-    PROJECT_ROOT,   
-    PROJECT_ROOT / "cleaning data with code",
-    Path.cwd()
-]
+# Average per council: False = mean of the postcode means (the published ranking),
+# True = meter-weighted mean, i.e. total kWh / meters, computed exactly from the sums
+WEIGHT_BY_METERS = False
+
+# Bootstrap confidence intervals of the change metrics, resampling the postcodes of every council
+# (see bootstrap_ci.py; off by default as it starts a process pool and can take up to its time budget)
+BOOTSTRAP_CI = False
+CI_FILE = SCRIPT_DIR / "Scotland_Council_Change_CI.csv"
+
+# Raw downloads (the SSPL zip) are cached here so they are only fetched once
+RAW_DIR = SCRIPT_DIR / "raw_data"
+
+# The typed store reader, SSPL index, download cache, data resolver, change metrics and rankings live with the cleaning code in "All Codes"
+sys.path.insert(0, str(PROJECT_ROOT / "All Codes"))
+from data_resolver import find_data, not_found_message
+from download_cache import fetch
+from bootstrap_ci import BOOTSTRAP_WINDOWS, bootstrap_change_intervals
+from change_metrics import EVENT_WINDOWS, available_windows, change_metrics, write_change_metrics
+from electricity_store import load_years
+from ranking_index import build_ranking_index, ranked_positions
+from schema_registry import get_schema
+from sspl_index import ensure_sspl_index, extract_sspl_csv, lookup_keys
 
 #UTILITY FUNCTIONS
 
-def find_path_smart(target_name: str, is_dir: bool = False) -> Path | None:
-    """
-    Locates a file or directory by searching through predefined paths.
-
-    Args:
-    target_name (str): The name of the file or directory to find.
-    is_dir (bool): Set to True if searching for a directory, False for a file.
-
-    Returns:
-    Path | None: The absolute path if found, otherwise None.
-    """
-    for base_path in SEARCH_PATHS:
-        candidate = base_path / target_name
-        if candidate.exists():
-            if is_dir and candidate.is_dir(): return candidate
-            elif not is_dir and candidate.is_file(): return candidate
-    
-    # Fallback recursive search in the project root
-    if is_dir:
-        found = list(PROJECT_ROOT.rglob(target_name))
-        for path in found:
-            if path.is_dir(): return path
-    else:
-        found = list(PROJECT_ROOT.rglob(target_name))
-        for path in found:
-            if path.is_file(): return path     
-            
-    return None
-
-
-def download_and_extract_sspl() -> Path | None:
-    """
-    Downloads the SSPL ZIP archive and extracts the CSV to the SCRIPT DIRECTORY.
-    
-    Returns:
-    Path | None: Path to the extracted CSV file, or None if failed.
-    """
-    print(f"SSPL file missing. Downloading from official source")
-    try:
-        response = requests.get(SSPL_URL, stream=True)
-        response.raise_for_status()
-        
-        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
-            # Identify the CSV file within the zip
-            csv_filename = next(
-                (f for f in zip_ref.namelist() if f.lower().endswith(".csv") and "__MACOSX" not in f), 
-                None
-            )
-            
-            if csv_filename:
-                #Extract to SCRIPT_DIR instead of PROJECT_ROOT
-                zip_ref.extract(csv_filename, SCRIPT_DIR)
-                
-                extracted_path = SCRIPT_DIR / Path(csv_filename).name
-                target_path = SCRIPT_DIR / SSPL_FILENAME
-                
-                if extracted_path != target_path:
-                    extracted_path.rename(target_path)
-                
-                return target_path
-            
-    except Exception as e:
-        print(f"Error during download/extraction: {e}")
-        return None
-        
-    return None
-
-
 def get_council_mapping() -> dict[str, str]:
     """
     Returns a dictionary mapping GSS Council Codes to readable Council Names.
@@ -137,97 +81,80 @@ def main():
     print("\nScotland Electricity Consumption Analysis (2015-2023)")
 
     #Locate Input Data
-    clean_data_dir = find_path_smart(DATA_DIR_NAME, is_dir=True)
+    clean_data_dir = find_data(DATA_DIR_NAME, is_dir=True, prefer=[SCRIPT_DIR])
     if not clean_data_dir:
-        print(f"Critical Error: Directory '{DATA_DIR_NAME}' not found.")
+        print(f"Critical Error: {not_found_message(DATA_DIR_NAME, prefer=[SCRIPT_DIR])}")
         print("Please run the data cleaning script first.")
         sys.exit(1)
 
-    #Locate Reference Data (SSPL)
-    sspl_path = find_path_smart(SSPL_FILENAME, is_dir=False)
-    if not sspl_path:
-        sspl_path = download_and_extract_sspl()
-        if not sspl_path: 
-            sys.exit(1)
-
-    #Load and Prepare Reference Data
+    #Locate Reference Data (SSPL) and Load it through the postcode index
+    sspl_path = find_data(SSPL_FILENAME, prefer=[SCRIPT_DIR])
     try:
-        # Read first row to dynamically detect column names
-        preview_df = pd.read_csv(sspl_path, nrows=1)
-        
-        postcode_col = next((c for c in preview_df.columns if 'postcode' in c.lower()), 'Postcode')
-        council_code_col = next((c for c in preview_df.columns if 'council' in c.lower() and 'code' in c.lower()), 'CouncilArea2019Code')
-        
-        sspl_df = pd.read_csv(sspl_path, usecols=[postcode_col, council_code_col], dtype=str, low_memory=False)
-        
-        sspl_df.rename(columns={postcode_col: 'Postcode', council_code_col: 'Council_Code'}, inplace=True)
-        sspl_df['Postcode'] = sspl_df['Postcode'].str.replace(" ", "").str.upper()
-        
+        if sspl_path:
+            # Memory-mapped postcode index, built from the SSPL CSV on the first run only
+            sspl_index = ensure_sspl_index(sspl_path)
+        else:
+            # The report notebook reads the CSV itself, so extract it from the (cached) zip and index it
+            print("SSPL file missing. Using the official source")
+            sspl_path = extract_sspl_csv(fetch(SSPL_URL, RAW_DIR), SCRIPT_DIR / SSPL_FILENAME)
+            sspl_index = ensure_sspl_index(sspl_path)
     except Exception as e:
         print(f"Error reading SSPL file: {e}")
         sys.exit(1)
 
     mapping_dict = get_council_mapping()
-    yearly_aggregates = []
 
-    #Process Yearly Electricity Data ---
+    #Load all Yearly Electricity Data at once ---
     print("Processing yearly data", end=" ", flush=True)
-    
-    for year in range(2015, 2024):
-        file_path = clean_data_dir / f"electricity_scotland_{year}.csv"
-        if not file_path.exists(): 
-            continue
-            
-        try:
-            elec_df = pd.read_csv(file_path)
-            elec_df.columns = [c.strip() for c in elec_df.columns]
-            
-            #Standardize Postcode
-            pc_col_data = next((c for c in elec_df.columns if c.lower() == 'postcode'), None)
-            if not pc_col_data: continue
-            elec_df['Postcode'] = elec_df[pc_col_data].astype(str).str.replace(" ", "").str.upper()
-            
-            #Identify Consumption
-            mean_col = next((c for c in elec_df.columns if 'mean' in c.lower() and 'cons' in c.lower()), None)
-            
-            if mean_col:
-                elec_df['Target_Value'] = pd.to_numeric(elec_df[mean_col], errors='coerce')
-            else:
-                total_col = next((c for c in elec_df.columns if 'total' in c.lower() and 'cons' in c.lower()), None)
-                num_col = next((c for c in elec_df.columns if 'num' in c.lower() and 'meter' in c.lower()), None)
-                if total_col and num_col:
-                    elec_df['Target_Value'] = pd.to_numeric(elec_df[total_col], errors='coerce') / pd.to_numeric(elec_df[num_col], errors='coerce')
-                else: 
-                    continue
-            
-            #Merge and Map
-            merged_df = pd.merge(elec_df, sspl_df, on="Postcode", how="left")
-            merged_df['Council_Area'] = merged_df['Council_Code'].map(mapping_dict)
-            
-            #Aggregate
-            grouped = merged_df.groupby('Council_Area')['Target_Value'].mean().reset_index()
-            grouped['Year'] = year
-            yearly_aggregates.append(grouped)
-            
-        except Exception:
-            continue
+
+    csv_paths = {year: clean_data_dir / f"electricity_scotland_{year}.csv" for year in range(2015, 2024)}
+    csv_paths = {year: path for year, path in csv_paths.items() if path.exists()}
+
+    try:
+        # Long format (one row per postcode and year), from the panel where it is up to date
+        elec_df = load_years(csv_paths, columns=['Postcode_Key', 'Num_meters', 'Total_cons_kwh', 'Mean_cons_kwh'])
+
+        # The schema registry resolves each year's column layout once; Mean_cons_kwh is optional
+        mean_years = [year for year, path in csv_paths.items() if 'Mean_cons_kwh' in get_schema(path)]
+
+        #Consumption per meter (totals in float64 so the sums below are not rounded)
+        elec_df['Total_cons_kwh'] = elec_df['Total_cons_kwh'].astype('float64')
+        per_meter = elec_df['Total_cons_kwh'] / elec_df['Num_meters']
+        elec_df['Target_Value'] = elec_df['Mean_cons_kwh'].astype('float64').where(elec_df['Year'].isin(mean_years), per_meter)
+
+        #Look up councils for every year in a single join on the SSPL index and Map
+        elec_df['Council_Code'] = lookup_keys(sspl_index, elec_df['Postcode_Key'], ['Council_Code'])['Council_Code']
+        elec_df['Council_Area'] = elec_df['Council_Code'].map(mapping_dict)
+
+        #Aggregate every year in one grouped pass
+        grouped = elec_df.groupby(['Council_Area', 'Year'], observed=True)
+        if WEIGHT_BY_METERS:
+            sums = grouped[['Total_cons_kwh', 'Num_meters']].sum()
+            final_df = (sums['Total_cons_kwh'] / sums['Num_meters']).rename('Target_Value').reset_index()
+        else:
+            final_df = grouped['Target_Value'].mean().reset_index()
+        final_df['Year'] = final_df['Year'].astype(int)
+
+    except Exception as e:
+        print(f"\nError processing yearly data: {e}")
+        sys.exit(1)
 
     print("Done.")
 
     #Final Calculation and Output
-    if not yearly_aggregates:
+    if final_df.empty:
         print("No valid data processed.")
         sys.exit(1)
 
-    final_df = pd.concat(yearly_aggregates, ignore_index=True)
     pivot_df = final_df.pivot(index='Council_Area', columns='Year', values='Target_Value')
     
     if 2015 in pivot_df.columns and 2023 in pivot_df.columns:
-        pivot_df['Change_kWh'] = pivot_df[2023] - pivot_df[2015]
-        pivot_df['Change_Pct'] = (pivot_df['Change_kWh'] / pivot_df[2015]) * 100
+        # Change_kWh and Change_Pct over the whole period (see change_metrics.py)
+        pivot_df = pivot_df.join(change_metrics(pivot_df, {'Change': (2015, 2023)}))
         
-        # Sort by Percentage Change
-        result_df = pivot_df.sort_values(by='Change_Pct', ascending=True)
+        # Order by Percentage Change through the ranking index (smallest first)
+        rankings = build_ranking_index(pivot_df, ['Change_Pct'])
+        result_df = pivot_df.iloc[ranked_positions(rankings, 'Change_Pct', largest=False)]
         
         print("\n" + "="*85)
         print(f"{'Council Area':<30} | {'2015 (kWh)':<12} | {'2023 (kWh)':<12} | {'Change (%)':<10}")
@@ -241,6 +168,28 @@ def main():
         cols_to_save = [c for c in pivot_df.columns if isinstance(c, int) or c in ['Change_kWh', 'Change_Pct']]
         result_df[cols_to_save].to_csv(OUTPUT_FILE)
         print(f"Ranked results saved to: {OUTPUT_FILE}")
+
+        # Precompute the event window metrics read by the rankings, maps and scatter plot,
+        # for the windows whose years were all cleaned (a year may have failed to download)
+        windows = available_windows(pivot_df, EVENT_WINDOWS)
+        for name in [name for name in EVENT_WINDOWS if name not in windows]:
+            print(f"Skipping {name}: years {EVENT_WINDOWS[name]} are not all in the data.")
+        print(f"Event metrics saved to: {write_change_metrics(OUTPUT_FILE, windows)}")
+
+        if BOOTSTRAP_CI:
+            # Resample the same per-postcode values the averages above were computed from
+            if WEIGHT_BY_METERS:
+                elec_df['Per_Meter'] = per_meter
+                value_col, weight_col = 'Per_Meter', 'Num_meters'
+            else:
+                value_col, weight_col = 'Target_Value', None
+            intervals = bootstrap_change_intervals(elec_df, 'Council_Area', value_col, weight_col,
+                                                   windows=available_windows(pivot_df, BOOTSTRAP_WINDOWS))
+            intervals.reindex(result_df.index).to_csv(CI_FILE)
+            print(f"Confidence intervals ({intervals['Replicates'].min()}+ replicates) saved to: {CI_FILE}")
+        else:
+            # Intervals of an earlier run no longer match the estimates just written
+            CI_FILE.unlink(missing_ok=True)
         
     else:
         print("Insufficient data to calculate 2015-2023 changes.")
@@ -0,0 +1,48 @@
+"""
+Regression checks for the typed census ingest in "All Codes/census_store.py".
+
+"""
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "All Codes"))
+from census_store import CENSUS_KEY, load_census, parse_census_table
+from electricity_store import HAS_PYARROW, store_path
+
+CENSUS_CSV = (
+    "Datazone 2011,Council,All households,Detached (%)\n"
+    "S01000001 ,Aberdeen City,\"1,204\",45.2%\n"
+    "S01000002,Aberdeen City,-,12%\n"
+)
+
+
+def test_parse_census_table_types_the_columns(tmp_path):
+    path = tmp_path / "housing_data_2011.csv"
+    path.write_text(CENSUS_CSV)
+
+    table = parse_census_table(path)
+
+    assert table[CENSUS_KEY].tolist() == ["S01000001", "S01000002"]
+    assert table["All households"].tolist()[0] == 1204.0
+    assert pd.isna(table["All households"].tolist()[1])
+    assert table["Detached (%)"].tolist() == [45.2, 12.0]
+    assert isinstance(table["Council"].dtype, pd.CategoricalDtype)
+
+
+def test_load_census_is_keyed_by_datazone_and_cached(tmp_path):
+    path = tmp_path / "housing_data.csv"
+    path.write_text(CENSUS_CSV.replace("Datazone 2011", "Data Zone"))
+
+    table = load_census(path, ["Detached (%)"])
+
+    assert table.index.name == CENSUS_KEY
+    assert list(table.columns) == ["Detached (%)"]
+    assert table.loc["S01000002", "Detached (%)"] == 12.0
+    assert store_path(path).exists() == HAS_PYARROW
+
+    consumption = pd.DataFrame({CENSUS_KEY: ["S01000002", "S01000001"], "Total_cons_kwh": [10.0, 20.0]})
+    joined = consumption.join(table, on=CENSUS_KEY)
+    assert joined["Detached (%)"].tolist() == [12.0, 45.2]
@@ -0,0 +1,67 @@
+"""
+Regression checks for the DataZone 2011 <-> 2022 crosswalk in "All Codes/datazone_crosswalk.py".
+
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "All Codes"))
+import datazone_crosswalk
+from datazone_crosswalk import build_crosswalk, crosswalk_path, load_crosswalk, remap, save_crosswalk
+from postcodes import encode_postcodes
+from sspl_index import ensure_sspl_index
+
+# Postcode -> (DataZone 2011, DataZone 2022): S01 splits in two, S02 and S03 merge
+POSTCODES = {
+    "EH1 1AA": ("S01", "T01"),
+    "EH1 1AB": ("S01", "T01"),
+    "EH1 1AD": ("S01", "T02"),
+    "G1 1AA": ("S02", "T03"),
+    "G1 1AB": ("S03", "T03"),
+}
+
+
+@pytest.fixture
+def sspl_index(tmp_path):
+    zones = pd.DataFrame.from_dict(POSTCODES, orient="index", columns=["DataZone2011Code", "DataZone2022Code"])
+    sspl = zones.rename_axis("Postcode").reset_index()
+    sspl["CouncilArea2019Code"] = "S12000036"
+    sspl["IntermediateZone2011Code"] = sspl["IntermediateZone2022Code"] = "I01"
+    sspl["Latitude"], sspl["Longitude"] = 55.95, -3.19
+    path = tmp_path / "Scottish_Postcode_Lookup_2025_1.csv"
+    sspl.to_csv(path, index=False)
+    return ensure_sspl_index(path), path
+
+
+@pytest.mark.parametrize("use_scipy", [True, False])
+def test_remap_preserves_totals(sspl_index, use_scipy, monkeypatch):
+    if use_scipy and not datazone_crosswalk.HAS_SCIPY:
+        pytest.skip("scipy not installed")
+    monkeypatch.setattr(datazone_crosswalk, "HAS_SCIPY", use_scipy)
+
+    crosswalk = build_crosswalk(sspl_index[0], "2011", "2022")
+    totals = pd.Series({"S01": 300.0, "S02": 50.0, "S03": 25.0})
+    remapped = remap(crosswalk, totals)
+
+    assert remapped.sum() == pytest.approx(totals.sum())
+    # Two of S01's three postcodes lie in T01
+    assert remapped["T01"] == pytest.approx(200.0)
+    assert remapped["T03"] == pytest.approx(75.0)
+
+
+def test_meter_weights_and_saved_crosswalk(sspl_index):
+    index, sspl_csv = sspl_index
+    meters = pd.DataFrame({"Postcode_Key": encode_postcodes(pd.Series(["EH1 1AA", "EH1 1AD"])), "Num_meters": [1, 3]})
+
+    crosswalk = build_crosswalk(index, "2011", "2022", meters)
+    loaded = load_crosswalk(save_crosswalk(crosswalk, crosswalk_path(sspl_csv)))
+    remapped = remap(loaded, pd.Series({"S01": 100.0}))
+
+    assert remapped["T01"] == pytest.approx(25.0)
+    assert remapped["T02"] == pytest.approx(75.0)
+    np.testing.assert_allclose(remapped.sum(), 100.0)
@@ -0,0 +1,46 @@
+"""
+Regression checks for the streaming ingest in "All Codes/file_cleaning.py".
+
+"""
+
+import codecs
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "All Codes"))
+from file_cleaning import write_scottish_csv
+
+ROWS = (
+    "EH1,EH1 1AA,10,41000.0,4100.0,3900.0\n"
+    "GL1,GL1 1AA,12,50000.0,4166.7,4000.0\n"
+    "G12,G12 8QQ,8,30000.0,3750.0,3600.0\n"
+)
+
+
+def clean(tmp_path, text: str, prefilter: bool) -> pd.DataFrame:
+    source = tmp_path / "uk.csv"
+    source.write_bytes(text.encode())
+    target = tmp_path / f"scotland_{prefilter}.csv"
+    write_scottish_csv(str(source), str(target), prefilter=prefilter)
+    return pd.read_csv(target)
+
+
+def test_bom_header_is_prefiltered_like_pandas(tmp_path):
+    text = codecs.BOM_UTF8.decode() + "Outcode,Postcode,Num_meters,Total_cons_kwh,Mean_cons_kwh,Median_cons_kwh\n" + ROWS
+
+    prefiltered = clean(tmp_path, text, prefilter=True)
+    pandas_only = clean(tmp_path, text, prefilter=False)
+
+    assert list(prefiltered.columns)[0] == "Outcode"
+    assert prefiltered["Postcode"].tolist() == ["EH1 1AA", "G12 8QQ"]
+    pd.testing.assert_frame_equal(prefiltered, pandas_only)
+
+
+def test_header_without_leading_outcode_falls_back_to_pandas(tmp_path):
+    text = "Postcode,Outcode,Num_meters\nEH1 1AA,EH1,10\nGL1 1AA,GL1,12\n"
+
+    prefiltered = clean(tmp_path, text, prefilter=True)
+
+    assert prefiltered["Postcode"].tolist() == ["EH1 1AA"]
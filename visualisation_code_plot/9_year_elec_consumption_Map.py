@@ -1,3 +1,4 @@
+import sys
 import geopandas as gpd
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -5,6 +6,11 @@ from pathlib import Path
 from adjustText import adjust_text
 import warnings
 
+# The shared data resolver lives with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from data_resolver import find_data, not_found_message
+
 # Suppress specific warnings from adjustText regarding arrow patches to keep the output clean
 warnings.filterwarnings("ignore", message=".*FancyArrowPatch.*")
 
@@ -14,35 +20,6 @@ DATA_FILE = "Scotland_Council_Change_Analysis.csv"
 # Official GeoJSON source for Scottish Local Authority Districts (LAD)
 GEOJSON_URL = "https://raw.githubusercontent.com/martinjc/UK-GeoJSON/master/json/administrative/sco/lad.json"
 
-#HELPER FUNCTION
-def find_data_file(filename):
-    """
-    Locate the input file recursively. 
-    This ensures the script runs correctly regardless of the current working directory.
-    """
-    script_dir = Path(__file__).resolve().parent
-    project_root = script_dir.parent
-    
-    # Priority search paths
-    possible_paths = [
-        script_dir / filename,
-        Path.cwd() / filename,
-        project_root / filename,
-        project_root / "council area with elec consumption" / filename
-    ]
-    
-    for path in possible_paths:
-        if path.exists(): return path
-            
-    # Fallback: Search entire project directory
-    try:
-        results = list(project_root.rglob(filename))
-        if results: return results[0]
-    except Exception:
-        pass
-
-    return None
-
 def plot_scotland_map_final():
     """
     Generates a high-resolution choropleth map of Scotland showing 9-year electricity consumption trends.
@@ -51,9 +28,9 @@ def plot_scotland_map_final():
     print("Generating Final 9-Year Trend Visualization")
 
     # 1. Load Statistical Data
-    csv_path = find_data_file(DATA_FILE)
+    csv_path = find_data(DATA_FILE, prefer=[SCRIPT_DIR])
     if not csv_path: 
-        print(f"Error: {DATA_FILE} not found. Please run the analysis script first.")
+        print(f"Error: {not_found_message(DATA_FILE, prefer=[SCRIPT_DIR])}. Please run the analysis script first.")
         return
     df = pd.read_csv(csv_path, index_col=0)
 
@@ -1,3 +1,4 @@
+import sys
 import geopandas as gpd
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -5,6 +6,12 @@ from pathlib import Path
 from adjustText import adjust_text
 import warnings
 
+# The shared data resolver and change metric engine live with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from change_metrics import load_change_metrics
+from data_resolver import find_data, not_found_message
+
 # Suppress warnings related to arrow patches in adjustText for a cleaner output log
 warnings.filterwarnings("ignore", message=".*FancyArrowPatch.*")
 
@@ -14,35 +21,6 @@ DATA_FILE = "Scotland_Council_Change_Analysis.csv"
 # Official GeoJSON source for Scottish Local Authority Districts
 GEOJSON_URL = "https://raw.githubusercontent.com/martinjc/UK-GeoJSON/master/json/administrative/sco/lad.json"
 
-#HELPER FUNCTION
-def find_data_file(filename):
-    """
-    Robust file finder that searches project directories recursively.
-    This ensures the script runs correctly regardless of the current working directory.
-    """
-    script_dir = Path(__file__).resolve().parent
-    project_root = script_dir.parent
-    
-    # Define priority search paths
-    possible_paths = [
-        script_dir / filename,
-        Path.cwd() / filename,
-        project_root / filename,
-        project_root / "council area with elec consumption" / filename
-    ]
-    
-    for path in possible_paths:
-        if path.exists(): return path
-            
-    # Fallback: Recursive search in the project root
-    try:
-        results = list(project_root.rglob(filename))
-        if results: return results[0]
-    except Exception:
-        pass
-
-    return None
-
 def generate_zoomed_map(gdf, df, target_col, title, output_filename, color_label):
     """
     Generates a high-resolution, cropped choropleth map.
@@ -131,11 +109,12 @@ def generate_zoomed_map(gdf, df, target_col, title, output_filename, color_label
 
 def process_event_maps():
     #Load Data
-    csv_path = find_data_file(DATA_FILE)
+    csv_path = find_data(DATA_FILE, prefer=[SCRIPT_DIR])
     if not csv_path: 
-        print(f"Error: {DATA_FILE} not found.")
+        print(f"Error: {not_found_message(DATA_FILE, prefer=[SCRIPT_DIR])}")
         return
-    df = pd.read_csv(csv_path, index_col=0)
+    # Event metrics are precomputed once per table (see change_metrics.py)
+    df = load_change_metrics(csv_path)
 
     #Load Map GeoJSON
     try:
@@ -165,15 +144,15 @@ def process_event_maps():
     }
     gdf['Council_Area'] = gdf['LAD13NM'].replace(name_corrections)
 
-    #Calculate Event-Specific Metrics
+    #Event-Specific Metrics
     
     # Scenario A: Covid Impact (2019 -> 2020)
     # Focus: Percentage Increase due to lockdowns
-    df['Covid_Impact'] = ((df['2020'] - df['2019']) / df['2019']) * 100
+    df['Covid_Impact'] = df['Covid_Impact_Pct']
     
     # Scenario B: Energy Crisis Impact (2021 -> 2022)
     # Focus: Percentage Decrease due to price hikes
-    df['Crisis_Impact'] = ((df['2022'] - df['2021']) / df['2021']) * 100
+    df['Crisis_Impact'] = df['Crisis_Impact_Pct']
 
     #Generate Maps
     generate_zoomed_map(
@@ -1,53 +1,62 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+# The shared data resolver and ranking index live with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from data_resolver import find_data, not_found_message
+from ranking_index import build_ranking_index, ranked_positions
+
 # Set plotting style to be clean and professional
 sns.set_theme(style="whitegrid")
 plt.rcParams['font.family'] = 'sans-serif'
 
-def find_data_file(filename):
-    """
-    Helper function to locate the data file in various directories.
-    """
-    script_dir = Path(__file__).resolve().parent
-    possible_paths = [
-        script_dir / filename,
-        Path.cwd() / filename,
-        script_dir.parent / filename,
-        script_dir.parent / "council area with elec consumption" / filename,
-        script_dir.parent / "clean_data" / filename,
-    ]
-    for path in possible_paths:
-        if path.exists(): return path
-    return None
-
 def plot_overall_trend_ranking():
     #Locate and Load Data
     filename = "Scotland_Council_Change_Analysis.csv"
-    data_path = find_data_file(filename)
+    data_path = find_data(filename, prefer=[SCRIPT_DIR])
     
     if not data_path:
-        print(f"Error: Could not find '{filename}'. Please ensure the analysis script was run.")
+        print(f"Error: {not_found_message(filename, prefer=[SCRIPT_DIR])}. Please ensure the analysis script was run.")
         return
 
     df = pd.read_csv(data_path, index_col=0)
     
     #Prepare Data for Plotting
-    # Sort the data: Largest reduction (most negative change) at the TOP
-    df_sorted = df.sort_values(by='Change_Pct', ascending=True)
+    # Order the data by the ranking index: Largest reduction (most negative change) at the TOP
+    rankings = build_ranking_index(df, ['Change_Pct'])
+    df_sorted = df.iloc[ranked_positions(rankings, 'Change_Pct', largest=False)]
     
     # Create a color list based on the values
     # Green for reduction (negative change), Red for increase (positive change)
     colors = ['#2ca02c' if x < 0 else '#d62728' for x in df_sorted['Change_Pct']]
     
+    # Bootstrap confidence intervals as error bars, if analyze_council_changes.py produced them
+    xerr = None
+    ci_path = find_data("Scotland_Council_Change_CI.csv", prefer=[SCRIPT_DIR])
+    if ci_path and ci_path.stat().st_mtime < data_path.stat().st_mtime:
+        print(f"Warning: {ci_path.name} is older than {filename}, drawing no error bars. "
+              "Please rerun the analysis with BOOTSTRAP_CI = True")
+    elif ci_path:
+        ci = pd.read_csv(ci_path, index_col=0).reindex(df_sorted.index)
+        low = df_sorted['Change_Pct'] - ci['Change_Pct_Low']
+        high = ci['Change_Pct_High'] - df_sorted['Change_Pct']
+        # Every estimate must lie inside its interval, otherwise the intervals belong to other data
+        if ((low >= 0) & (high >= 0)).all():
+            xerr = [low.to_numpy(), high.to_numpy()]
+        else:
+            print(f"Warning: {ci_path.name} does not match {filename}, drawing no error bars.")
+
     #Create the Horizontal Bar Chart
     # Set figure height to fit all 32 council areas comfortably
     plt.figure(figsize=(12, 14))
     
     # Create the bars
-    bars = plt.barh(df_sorted.index, df_sorted['Change_Pct'], color=colors, height=0.65)
+    bars = plt.barh(df_sorted.index, df_sorted['Change_Pct'], color=colors, height=0.65,
+                    xerr=xerr, error_kw={'ecolor': 'dimgrey', 'capsize': 3, 'linewidth': 1})
     
     #Add Styling and Decorations
     plt.axvline(0, color='black', linewidth=1.2, linestyle='-') # Center line at 0%
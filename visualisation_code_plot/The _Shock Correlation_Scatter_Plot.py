@@ -1,42 +1,36 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+# The shared data resolver and change metric engine live with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from change_metrics import load_change_metrics
+from data_resolver import find_data, not_found_message
+
 # Set plotting style
 sns.set_theme(style="whitegrid")
 plt.rcParams['font.family'] = 'sans-serif'
 
-def find_data_file(filename):
-    script_dir = Path(__file__).resolve().parent
-    possible_paths = [
-        script_dir / filename,
-        Path.cwd() / filename,
-        script_dir.parent / filename,
-        script_dir.parent / "council area with elec consumption" / filename,
-        script_dir.parent / "clean_data" / filename,
-    ]
-    for path in possible_paths:
-        if path.exists(): return path
-    return None
-
 def plot_shock_correlation():
     filename = "Scotland_Council_Change_Analysis.csv"
-    data_path = find_data_file(filename)
+    data_path = find_data(filename, prefer=[SCRIPT_DIR])
     
     if not data_path:
-        print("Error: Data file not found.")
+        print(f"Error: {not_found_message(filename, prefer=[SCRIPT_DIR])}")
         return
 
     try:
-        df = pd.read_csv(data_path, index_col=0)
+        # Event metrics are precomputed once per table (see change_metrics.py)
+        df = load_change_metrics(data_path)
     except Exception as e:
         print(f"Error reading file: {e}")
         return
 
-    # Recalculate metrics
-    df['Covid_Impact'] = ((df['2020'] - df['2019']) / df['2019']) * 100
-    df['Crisis_Impact'] = ((df['2022'] - df['2021']) / df['2021']) * 100
+    df['Covid_Impact'] = df['Covid_Impact_Pct']
+    df['Crisis_Impact'] = df['Crisis_Impact_Pct']
 
     plt.figure(figsize=(14, 11)) # Larger figure size to accommodate text labels
     
@@ -1,32 +1,25 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+# The shared data resolver lives with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from data_resolver import find_data, not_found_message
+
 # Set plotting style
 sns.set_theme(style="whitegrid")
 plt.rcParams['font.family'] = 'sans-serif'
 
-def find_data_file(filename):
-    script_dir = Path(__file__).resolve().parent
-    possible_paths = [
-        script_dir / filename,
-        Path.cwd() / filename,
-        script_dir.parent / filename,
-        script_dir.parent / "council area with elec consumption" / filename,
-        script_dir.parent / "clean_data" / filename,
-    ]
-    for path in possible_paths:
-        if path.exists(): return path
-    return None
-
 def plot_urban_vs_island_trend():
     #Load Data
     filename = "Scotland_Council_Change_Analysis.csv"
-    data_path = find_data_file(filename)
+    data_path = find_data(filename, prefer=[SCRIPT_DIR])
     
     if not data_path:
-        print("Error: Data file not found.")
+        print(f"Error: {not_found_message(filename, prefer=[SCRIPT_DIR])}")
         return
 
     df = pd.read_csv(data_path, index_col=0)
@@ -1,34 +1,29 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
 import seaborn as sns
 
-sns.set_theme(style="whitegrid")
-plt.rcParams['font.family'] = 'sans-serif'
+# The shared data resolver, SSPL index and volatility statistics live with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from data_resolver import find_data, not_found_message
+from sspl_index import ensure_sspl_index, load_sspl_index
+from volatility import VOLATILITY_LEVELS, stream_volatility
 
+SSPL_FILENAME = "Scottish_Postcode_Lookup_2025_1.csv"
 
+sns.set_theme(style="whitegrid")
+plt.rcParams['font.family'] = 'sans-serif'
 
-# Function: Find dataset
 
-def find_data_file(filename):
-    script_dir = Path(__file__).resolve().parent
-    possible_paths = [
-        script_dir / filename,
-        script_dir.parent / filename,
-        script_dir.parent / "clean data" / filename,
-        script_dir.parent / "council area with elec consumption" / filename,
-    ]
-    for path in possible_paths:
-        if path.exists():
-            return path
-    return None
 
 def main():
     filename = "Scotland_Council_Change_Analysis.csv" # Name of CSV dataset
-    data_path = find_data_file(filename)
+    data_path = find_data(filename, prefer=[SCRIPT_DIR])
 
     if not data_path:
-        print("Error: Could not locate the file.")
+        print(f"Error: {not_found_message(filename, prefer=[SCRIPT_DIR])}")
         return
 
     # Load CSV
@@ -76,5 +71,28 @@ def main():
     print(f"\nVariance chart saved to: {bar_chart_path}\n")
 
 
+    # Step 5: Volatility of every DataZone and postcode
+    # Streamed over the yearly panel partitions, so the postcode x year matrix is never held in memory
+    panel_dir = find_data("consumption_panel", is_dir=True, prefer=[SCRIPT_DIR])
+    sspl_file = find_data(SSPL_FILENAME, prefer=[SCRIPT_DIR])
+    sspl_file = sspl_file or find_data(Path(SSPL_FILENAME).stem + ".index", is_dir=True, prefer=[SCRIPT_DIR])
+
+    if not panel_dir or not sspl_file:
+        print("Panel or SSPL file not found, DataZone and postcode volatility skipped.")
+        return
+
+    sspl_index = load_sspl_index(sspl_file) if sspl_file.is_dir() else ensure_sspl_index(sspl_file)
+
+    for level in VOLATILITY_LEVELS:
+        stats = stream_volatility(panel_dir, level, sspl_index)
+        stats_path = save_dir / f"{level}_Volatility.csv"
+        stats.to_csv(stats_path)
+
+        # Print the 10 most volatile areas relative to their consumption
+        print(f"\nTop {level}s by coefficient of variation:\n")
+        print(stats[stats["Years"] > 1].sort_values("CV", ascending=False).head(10))
+        print(f"\n{level} volatility saved to: {stats_path}")
+
+
 if __name__ == "__main__":
     main()
@@ -1,39 +1,32 @@
+import sys
 import pandas as pd
 from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+# The shared data resolver and change metric engine live with the cleaning code in "All Codes"
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "All Codes"))
+from change_metrics import change_tensor, save_change_tensor, year_change
+from data_resolver import find_data, not_found_message
+
 sns.set_theme(style="whitegrid")
 plt.rcParams['font.family'] = 'sans-serif'
 
+# Save the change between every pair of years, so any "year A vs year B" comparison is a lookup
+SAVE_CHANGE_TENSOR = True
+TENSOR_FILE = "YoY_Change_Tensor.npz"
 
 
-# Find CSV anywhere in project
-
-def find_data_file(filename):
-    script_dir = Path(__file__).resolve().parent
-    possible_paths = [
-        script_dir / filename,
-        script_dir.parent / filename,
-        script_dir.parent / "clean_data" / filename,
-        script_dir.parent / "council area with elec consumption" / filename,
-        Path.cwd() / filename,
-    ]
-    # We loop through all possible paths and return the one that exists.
-    for p in possible_paths:
-        if p.exists():     # if the file we want exists at this path
-            return p
-    return None
-
 
 def main():
 
     # Load data
     filename = "Scotland_Council_Change_Analysis.csv"
-    data_path = find_data_file(filename)  # Search for csv
+    data_path = find_data(filename, prefer=[SCRIPT_DIR])  # Search for csv
 
     if not data_path:
-        print("CSV not found.")
+        print(not_found_message(filename, prefer=[SCRIPT_DIR]))
         return
 
     df = pd.read_csv(data_path)           # Load my csv into pandas dataframe.
@@ -50,28 +43,26 @@ def main():
     # Make pivot table (rows = council, columns = years)
     pivot = df.set_index("Council_Area")[year_cols]
 
-    # Compute year-on-year
-    yoy_kwh = {}     # Dictionary for absolute change (kWh)
-    yoy_pct = {}     # Dictionary for percent change (%)
+    # Compute the change between every pair of years (kWh and %) in one operation,
+    # in float64 like the plotted values (the saved copy is float32)
+    tensor = change_tensor(pivot, dtype="float64")
 
-    for i in range(1, len(year_cols)):
-        prev = year_cols[i - 1]  # Calculation for previous year 
-        curr = year_cols[i]      # Calculation for current year
+    # Year-on-year columns are lookups in the tensor: absolute change (kWh), then percentage change (%)
+    consecutive = list(zip(year_cols[:-1], year_cols[1:]))
+    yoy = {f"Change_{prev}_{curr}": year_change(tensor, int(prev), int(curr), "kwh") for prev, curr in consecutive}
+    yoy |= {f"Percent_{prev}_{curr}": year_change(tensor, int(prev), int(curr), "pct") for prev, curr in consecutive}
 
-        # We now compute the absolute change between years
-        yoy_kwh[f"Change_{prev}_{curr}"] = pivot[curr] - pivot[prev]
-        # then, we compute percentage change
-        yoy_pct[f"Percent_{prev}_{curr}"] = (pivot[curr] - pivot[prev]) / pivot[prev] * 100
-
-    # Add new columns, add YoY results back into pivot table
-    for c in yoy_kwh:  pivot[c] = yoy_kwh[c]
-    for c in yoy_pct: pivot[c] = yoy_pct[c]
+    # Add YoY results back into pivot table in one go
+    pivot = pivot.join(pd.DataFrame(yoy))
 
     
     # GRAPH 1 – National Average Trend (2015–2023)
 
     save_dir = Path(__file__).resolve().parent
 
+    if SAVE_CHANGE_TENSOR:
+        out0 = save_change_tensor(tensor, save_dir / TENSOR_FILE)
+
     scotland_avg = pivot[year_cols].mean()
 
     plt.figure(figsize=(10, 6)) # Define plot size
@@ -110,6 +101,8 @@ def main():
 
 
     print("\nSaved:")
+    if SAVE_CHANGE_TENSOR:
+        print(" -", out0)
     print(" -", out1)
     if col in pivot.columns:
         print(" -", out2)